@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, NamedTuple, Optional
+
+
+MISSING = object()
+
+
+class ReadCache:
+    """
+    Bounded LRU cache for read endpoint results.
+
+    Every write bumps `version` and drops all entries, so a cached value is
+    never older than the last write. Values loaded while a write was in
+    flight are not stored, see `set`.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, version: int):
+        """
+        Stores a value loaded at `version`. If the data changed since then
+        the value may already be stale, so it is dropped.
+        """
+        if version != self.version:
+            return
+
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self.version += 1
+        self._entries.clear()
+
+
+class CachedTeam(NamedTuple):
+    id: int
+    primary_color: str
+    secondary_color: str
+    div: int
+
+
+class TeamCache:
+    """
+    Name -> (id, colors, div) for every team, so ingest can resolve teams
+    without a query and only write when a team is new or its colors changed.
+
+    Filled at startup and updated by every team write in this process. A miss
+    is never wrong, it just means the caller has to go to the database.
+    """
+
+    def __init__(self):
+        self._by_name: Dict[str, CachedTeam] = {}
+        self._names: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def get(self, name: str) -> Optional[CachedTeam]:
+        return self._by_name.get(name)
+
+    def put(self, team) -> CachedTeam:
+        """
+        Stores a Team record, replacing any entry with the same id or name.
+        """
+        self.forget(team.id)
+        previous = self._by_name.get(team.name)
+        if previous is not None:
+            self.forget(previous.id)
+        entry = CachedTeam(team.id, team.primaryColor, team.secondaryColor, team.div)
+        self._by_name[team.name] = entry
+        self._names[team.id] = team.name
+        return entry
+
+    def load(self, teams: Iterable):
+        self.clear()
+        for team in teams:
+            self.put(team)
+
+    def forget(self, team_id: int):
+        name = self._names.pop(team_id, None)
+        if name is not None:
+            self._by_name.pop(name, None)
+
+    def clear(self):
+        self._by_name.clear()
+        self._names.clear()
@@ -0,0 +1,100 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+from prisma import Prisma
+from backend.metrics import DB_QUERY_LATENCY
+
+
+logger = logging.getLogger("backend.queries")
+
+# Warn when a request issues more queries than this. Unset in production.
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "0")) or None
+
+
+class QueryStats:
+    """
+    Number of queries and time spent in them for one request or test block.
+    With record=True the (model, method) of every query is kept as well.
+    """
+
+    def __init__(self, record: bool = False):
+        self.count = 0
+        self.seconds = 0.0
+        self.queries: Optional[List[Tuple[str, str]]] = [] if record else None
+
+    def add(self, model: str, method: str, elapsed: float):
+        self.count += 1
+        self.seconds += elapsed
+        if self.queries is not None:
+            self.queries.append((model, method))
+
+
+# Every QueryStats that is collecting in the current context. A request
+# started inside count_queries() adds to both the request's and the
+# caller's stats.
+current_query_stats: ContextVar[Tuple[QueryStats, ...]] = ContextVar("current_query_stats", default=())
+
+
+@contextmanager
+def count_queries(record: bool = True) -> Iterator[QueryStats]:
+    """
+    Counts the queries issued inside the block.
+    """
+    stats = QueryStats(record=record)
+    token = current_query_stats.set(current_query_stats.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryStats]:
+    """
+    Fails if the block issues more than `limit` queries, listing them.
+
+        with assert_max_queries(3):
+            await client.get("/games")
+    """
+    with count_queries() as stats:
+        yield stats
+
+    if stats.count > limit:
+        issued = "\n".join(f"  {model}.{method}" for model, method in stats.queries)
+        raise AssertionError(f"Expected at most {limit} queries, got {stats.count}:\n{issued}")
+
+
+def check_query_budget(stats: QueryStats, method: str, route: str):
+    """
+    Logs a warning when a request goes over QUERY_BUDGET.
+    """
+    if QUERY_BUDGET is not None and stats.count > QUERY_BUDGET:
+        logger.warning("%s %s issued %d queries (budget %d)", method, route, stats.count, QUERY_BUDGET)
+
+
+class InstrumentedPrisma(Prisma):
+    """
+    Prisma client that times every query and adds it to the active
+    QueryStats, if any.
+
+    All model actions and raw queries go through _execute, including those
+    made on transaction clients (tx() copies the client's class). Batches
+    are sent as one engine call and are not counted.
+    """
+
+    async def _execute(self, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super()._execute(**kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            model = kwargs.get("model")
+            model_name = model.__name__ if model else "raw"
+            method = kwargs.get("method", "")
+            DB_QUERY_LATENCY.observe(elapsed, model=model_name, method=method)
+
+            for stats in current_query_stats.get():
+                stats.add(model_name, method, elapsed)
@@ -0,0 +1,141 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: bytes
+    headers: Dict[str, str]
+
+
+class _Entry:
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        # None while the first request with this key is still running
+        self.response: Optional[StoredResponse] = None
+
+
+class FingerprintMismatch(Exception):
+    pass
+
+
+class RequestInProgress(Exception):
+    pass
+
+
+class IdempotencyStore:
+    """
+    Completed responses by Idempotency-Key, kept for `ttl` seconds and at
+    most `max_entries` of them (oldest dropped first).
+
+    A key is claimed by the first request that uses it, and that request's
+    response is stored once it succeeds. Each key is bound to a fingerprint
+    of the request it was first used with, so reusing it for a different
+    request is an error instead of a silent replay.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """
+        Returns the stored response for a replay, or None if the caller now
+        owns the key and must `complete` or `release` it.
+
+        Raises FingerprintMismatch if the key was used for another request
+        and RequestInProgress if its first request hasn't finished.
+        """
+        now = time.monotonic()
+        self._expire(now)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = _Entry(fingerprint, now + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return None
+
+        if entry.fingerprint != fingerprint:
+            raise FingerprintMismatch()
+        if entry.response is None:
+            raise RequestInProgress()
+        return entry.response
+
+    def complete(self, key: str, response: StoredResponse):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.response = response
+
+    def release(self, key: str):
+        """
+        Gives up a claimed key without storing anything, so the request can
+        be retried with it.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.response is None:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def _expire(self, now: float):
+        # Entries are kept in insertion order and share one ttl, so the
+        # expired ones are always at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            del self._entries[key]
+
+
+def request_fingerprint(method: str, path: str, query: str, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query.encode(), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+async def run_idempotent(store: IdempotencyStore, request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    """
+    Handles a request carrying an Idempotency-Key: replays the stored
+    response if there is one, otherwise runs the request and stores its
+    response. Server errors aren't stored, so those can be retried.
+    """
+    key = request.headers["idempotency-key"]
+    fingerprint = request_fingerprint(request.method, request.url.path, request.url.query, await request.body())
+
+    try:
+        stored = store.claim(key, fingerprint)
+    except FingerprintMismatch:
+        return JSONResponse(status_code=422, content={"detail": "Idempotency-Key was already used for a different request"})
+    except RequestInProgress:
+        return JSONResponse(status_code=409, content={"detail": "A request with this Idempotency-Key is still in progress"}, headers={"Retry-After": "1"})
+
+    if stored is not None:
+        return Response(content=stored.body, status_code=stored.status_code, headers={**stored.headers, "Idempotent-Replayed": "true"})
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        store.release(key)
+        raise
+
+    if response.status_code >= 500:
+        store.release(key)
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    store.complete(key, StoredResponse(response.status_code, body, headers))
+    return Response(content=body, status_code=response.status_code, headers=headers)
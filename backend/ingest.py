@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional
+from backend.metrics import INGEST_QUEUE_DEPTH
+
+
+logger = logging.getLogger("backend.ingest")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class IngestJob:
+    def __init__(self, item: Any):
+        self.id = secrets.token_hex(8)
+        self.item = item
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestQueue:
+    """
+    Bounded in-process queue for writes the client doesn't need to wait for.
+
+    `submit` enqueues an item and returns its job right away, or raises
+    QueueFull so the endpoint can push back. A pool of workers takes up to
+    `batch_size` queued jobs at a time and hands their items to `apply` in one
+    call, which must return one result per item. If a batch fails, its jobs
+    are retried one at a time so only the bad ones fail. Finished jobs are kept
+    (the most recent `max_jobs`) so clients can poll for them.
+
+    Jobs only live in memory: anything still queued when the process dies
+    is lost, and the client is expected to resubmit it.
+    """
+
+    def __init__(self, apply: Callable[[List[Any]], Awaitable[List[Any]]], max_size: int = 1000, workers: int = 2, batch_size: int = 100, max_jobs: int = 10000):
+        self._apply = apply
+        self.max_size = max_size
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def submit(self, item: Any) -> IngestJob:
+        self._start()
+        job = IngestJob(item)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"Ingest queue is full ({self.max_size} jobs)")
+        INGEST_QUEUE_DEPTH.inc()
+
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id)
+
+    async def join(self):
+        """
+        Waits until every submitted job has been applied.
+        """
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def close(self):
+        """
+        Applies whatever is still queued, then stops the workers.
+        """
+        await self.join()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._queue = None
+        self._loop = None
+
+    def _start(self):
+        # Queues and tasks belong to one event loop, so start over if the
+        # loop changed (tests get a fresh loop per test)
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(self.max_size)
+        self._tasks = [loop.create_task(self._work(self._queue)) for _ in range(self.workers)]
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            INGEST_QUEUE_DEPTH.dec(len(batch))
+
+            for job in batch:
+                job.status = "running"
+            try:
+                await self._run(batch)
+            finally:
+                for job in batch:
+                    job.finished_at = time.time()
+                    queue.task_done()
+
+    async def _run(self, jobs: List[IngestJob]):
+        try:
+            results = await self._apply([job.item for job in jobs])
+        except Exception as e:
+            if len(jobs) > 1:
+                logger.exception("Ingest batch of %d jobs failed, retrying them one at a time", len(jobs))
+                for job in jobs:
+                    await self._run([job])
+                return
+            logger.exception("Ingest job %s failed", jobs[0].id)
+            jobs[0].status = "failed"
+            jobs[0].error = str(e)
+            return
+
+        for job, result in zip(jobs, results):
+            job.status = "done"
+            job.result = result
@@ -1,49 +1,228 @@
-from fastapi import FastAPI, HTTPException, Request
-from prisma import Prisma, models
-from prisma.models import Game
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
+from prisma import models
+from prisma.models import Game, Team
+import pydantic
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
-from typing import List, Optional
-from models import ScrapedGame, TeamModel
+from typing import Dict, List, Optional, Set, Tuple
+from models import GameKey, ScrapedGame, TeamModel
 from prisma.enums import GameStatus
-from datetime import datetime
+from prisma.errors import UniqueViolationError
+from datetime import datetime, timedelta, timezone
+import base64
+import csv
+import hashlib
+import io
+import json
+import numpy as np
+import orjson
+import re
+import secrets
+import time
+from enum import Enum
+from backend.scheduler import RefreshScheduler
+from backend.ingest import IngestQueue, QueueFull
+from backend.cache import ReadCache, TeamCache, CachedTeam, MISSING
+from backend.access_log import AccessLogger
+from backend.idempotency import IdempotencyStore, run_idempotent
+from backend.db import InstrumentedPrisma, QueryStats, current_query_stats, check_query_budget
+from backend.metrics import registry, REQUEST_LATENCY, REQUESTS_IN_FLIGHT, REQUEST_QUERIES, REQUEST_QUERY_TIME, GAMES_INGESTED, STANDINGS_REFRESH_TIME
+
+
+
+db = InstrumentedPrisma()
+
+# Responses of the read endpoints, dropped on every write. The data only
+# changes when the scraper runs, so most bot lookups are served from here.
+read_cache = ReadCache(max_entries=1024)
+
+async def cached(key, load):
+    """
+    Returns the cached value for key, or awaits load() and caches its result.
+    """
+    value = read_cache.get(key)
+    if value is not MISSING:
+        return value
+
+    version = read_cache.version
+    value = await load()
+    read_cache.set(key, value, version)
+    return value
+
+# Distinguishes ETags from different runs of the process, since
+# read_cache.version restarts at 0
+ETAG_EPOCH = secrets.token_hex(4)
+
+def etag_for(key, version: Optional[int] = None) -> str:
+    if version is None:
+        version = read_cache.version
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    return f'"{ETAG_EPOCH}-{version}-{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+async def cached_read(request: Request, response: Response, key, load):
+    """
+    Serves a read endpoint from read_cache with a strong ETag. A matching
+    If-None-Match gets a 304 without running the query.
+    """
+    etag = etag_for(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
 
+    response.headers["ETag"] = etag
+    return await cached(key, load)
 
+# Lets ingest resolve team names without a query. Kept in sync by every
+# endpoint that creates, renames, recolors or deletes teams.
+team_cache = TeamCache()
 
-db = Prisma()
+def data_changed():
+    """
+    Must be called by every endpoint that writes to the database.
+    """
+    read_cache.invalidate()
+
+# Rank-ordered teams per division, rebuilt on the first read after ranks are
+# recomputed. Stat deltas alone don't invalidate it, so it never pairs new
+# stats with ranks that haven't caught up yet.
+standings_snapshot: Optional[Dict[int, List[Team]]] = None
+standings_version = 0
+
+def standings_changed():
+    global standings_snapshot, standings_version
+    standings_snapshot = None
+    standings_version += 1
+
+async def load_standings() -> Dict[int, List[Team]]:
+    global standings_snapshot
+    if standings_snapshot is None:
+        version = standings_version
+        snapshot = {}
+        for team in await db.team.find_many(order=[{"div": "asc"}, {"rank": "asc"}]):
+            snapshot.setdefault(team.div, []).append(team)
+        if version == standings_version:
+            standings_snapshot = snapshot
+        return snapshot
+    return standings_snapshot
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Handles database connection on startup and disconnection on shutdown.
     """
+    access_logger.start()
     print("Connecting to database...")
     await db.connect()
     print("Connected!")
+    team_cache.load(await db.team.find_many())
     yield
+    await ingest_queue.close()
+    await refresh_scheduler.close()
     print("Disconnecting from database...")
     await db.disconnect()
     print("Disconnected.")
+    access_logger.stop()
 
 
 app = FastAPI(lifespan=lifespan)
 
+access_logger = AccessLogger()
+
+# Completed responses of retried writes, by Idempotency-Key
+idempotency_store = IdempotencyStore(ttl=24 * 3600, max_entries=10000)
+
+IDEMPOTENT_ROUTES = [
+    ("POST", re.compile(r"/games")),
+    ("POST", re.compile(r"/teams")),
+    ("PUT", re.compile(r"/games/\d+")),
+]
+
+# Registered before observe_requests, so it runs inside it and replays are
+# still logged and measured
+@app.middleware("http")
+async def idempotent_writes(request: Request, call_next):
+    """
+    Answers retried writes that carry an Idempotency-Key from memory.
+    """
+    if "idempotency-key" in request.headers and any(
+        request.method == method and pattern.fullmatch(request.url.path)
+        for method, pattern in IDEMPOTENT_ROUTES
+    ):
+        return await run_idempotent(idempotency_store, request, call_next)
+    return await call_next(request)
+
 @app.middleware("http")
-async def log_requests(request: Request, call_next):
-    print(f"Incoming request: {request.method} {request.url}")
-    print("Headers:", request.headers)
-    # if request.method in ["POST", "PUT"]:
-        # body = await request.json()
-        # print("Body:", body)
-    response = await call_next(request)
-    return response
+async def observe_requests(request: Request, call_next):
+    """
+    Writes the access log line and records request metrics.
+    """
+    started = time.perf_counter()
+    status = 500
+    query_stats = QueryStats()
+    token = current_query_stats.set(current_query_stats.get() + (query_stats,))
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        current_query_stats.reset(token)
+        REQUESTS_IN_FLIGHT.dec()
+        route = route_template(request)
+        check_query_budget(query_stats, request.method, route or request.url.path)
+
+        # Label by route template, never the raw path, to bound cardinality
+        labels = {"method": request.method, "route": route or "unmatched"}
+        REQUEST_LATENCY.observe(time.perf_counter() - started, status=status, **labels)
+        REQUEST_QUERIES.observe(query_stats.count, **labels)
+        REQUEST_QUERY_TIME.observe(query_stats.seconds, **labels)
+
+        access_logger.log(
+            request.method,
+            request.url.path,
+            route,
+            status,
+            started,
+            request.headers
+        )
+
+def route_template(request: Request) -> Optional[str]:
+    """
+    The path template of the route that handled the request. Responses
+    short-circuited before routing, such as idempotent replays, are matched
+    against the routes here so they're labelled the same way.
+    """
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return None
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Exposes request, query, ingest and refresh metrics in Prometheus text format.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/teams")
 async def create_team(team_data: TeamModel):
     """
     Creates a new team in the database.
     """
-    
+    previous = await db.team.find_unique(where={"name": team_data.name})
     team = await db.team.upsert(
         where={
             "name": team_data.name
@@ -64,18 +243,22 @@ async def create_team(team_data: TeamModel):
         }
     )
 
+    team_cache.put(team)
+    mark_div_change(previous.div if previous else None, team)
+    data_changed()
+    standings_changed()
     return team
 
 @app.get("/teams")
-async def get_teams(name: Optional[str] = None, id: Optional[int] = None):
+async def get_teams(request: Request, response: Response, name: Optional[str] = None, id: Optional[int] = None):
     """
     Retrieves all teams from the database.
     """
     if name:
-        return await db.team.find_unique(where={"name": name})
+        return await cached_read(request, response, ("team", "name", name), lambda: db.team.find_unique(where={"name": name}))
     if id:
-        return await db.team.find_unique(where={"id": id})
-    return await db.team.find_many()
+        return await cached_read(request, response, ("team", "id", id), lambda: db.team.find_unique(where={"id": id}))
+    return await cached_read(request, response, ("teams",), lambda: db.team.find_many())
 
 
 @app.put("/teams/{team_id}")
@@ -83,6 +266,7 @@ async def update_team(team_id: int, team_data: TeamModel):
     """
     Updates an existing team in the database.
     """
+    previous = await db.team.find_unique(where={"id": team_id})
     updated_team = await db.team.update(
         where={"id": team_id},
         data={
@@ -92,93 +276,598 @@ async def update_team(team_id: int, team_data: TeamModel):
             "div": team_data.div
         }
     )
+    if updated_team:
+        team_cache.put(updated_team)
+        mark_div_change(previous.div if previous else None, updated_team)
+    data_changed()
+    standings_changed()
     return updated_team
 
+def mark_div_change(previous_div: Optional[int], team: Team):
+    """
+    Re-ranks both divisions when a team moves (or a new one arrives): the
+    old one has a gap where it was and the new one would get a duplicate rank.
+    """
+    if previous_div != team.div:
+        refresh_scheduler.mark(divs=[div for div in (previous_div, team.div) if div is not None])
+
 @app.delete("/teams/{team_id}")
 async def delete_team(team_id: int):
     """
     Deletes a team from the database.
     """
     deleted_team = await db.team.delete(where={"id": team_id})
+    team_cache.forget(team_id)
+    data_changed()
+    standings_changed()
     return deleted_team
 
 
 
 
 @app.post("/games")
-async def create_game(game_data: ScrapedGame):
+async def create_game(game_data: ScrapedGame, run_async: bool = Query(False, alias="async")):
+    """
+    Creates a game unless one already exists at the same time and location.
 
-    existing_game = await db.game.find_first(
-        where={
-            "gameTime": game_data.game_time,
-            "location": f"{game_data.field_name} - Field {game_data.field_num}",
+    With ?async=true the game is queued instead and the response is a 202
+    with a job id to poll at /jobs/{job_id}. A full queue answers 503.
+    """
+    if run_async:
+        try:
+            job = ingest_queue.submit(game_data)
+        except QueueFull as e:
+            GAMES_INGESTED.inc(outcome="rejected")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job.id, "status": job.status},
+            headers={"Location": f"/jobs/{job.id}"}
+        )
+
+    # Parsed once and used for both the probe and the insert, so offset-less
+    # times are UTC in both, as they are for /games/bulk
+    natural_key = {
+        "gameTime_location": {
+            "gameTime": parse_game_time(game_data.game_time),
+            "location": format_location(game_data.field_name, game_data.field_num),
         }
-    )
+    }
+
+    # Cheap index probe so replays don't touch the teams
+    existing_game = await db.game.find_unique(where=natural_key)
 
     if existing_game:
+        GAMES_INGESTED.inc(outcome="exists")
         return {"message": "Game already exists", "game": existing_game}
 
-    home_team = await db.team.upsert(
-        where={
-            "name": game_data.home_team
-        },
-        data={
-            "create": {
-                "name": game_data.home_team,
-                "primaryColor": game_data.home_team_primary_color,
-                "secondaryColor": game_data.home_team_secondary_color,
-                "div": 1
-            },
-            "update": {
-                "primaryColor": game_data.home_team_primary_color,
-                "secondaryColor": game_data.home_team_secondary_color,
+    # New home teams go in div 1 and new away teams in div 0
+    home_team = await resolve_team(game_data.home_team, game_data.home_team_primary_color, game_data.home_team_secondary_color, 1)
+    away_team = await resolve_team(game_data.away_team, game_data.away_team_primary_color, game_data.away_team_secondary_color, 0)
+
+
+    # INSERT ... ON CONFLICT DO NOTHING, so overlapping ingests can't both
+    # create the game. Only the request that inserted it applies its stats.
+    created = await db.game.create_many(
+        data=[{
+            **natural_key["gameTime_location"],
+            "homeScore": game_data.home_score,
+            "awayScore": game_data.away_score,
+            "homeTeamId": home_team.id,
+            "awayTeamId": away_team.id,
+            "status": get_game_status(game_data),
+            "info": game_data.info
+        }],
+        skip_duplicates=True
+    )
+    new_game = await db.game.find_unique(where=natural_key)
+
+    data_changed()
+
+    if not created:
+        GAMES_INGESTED.inc(outcome="exists")
+        return {"message": "Game already exists", "game": new_game}
+
+    GAMES_INGESTED.inc(outcome="created")
+
+    # Re-rank even without a result so new teams get a place in the table
+    await apply_stats(game_stats_deltas(new_game))
+    refresh_scheduler.mark(team_ids=[home_team.id, away_team.id])
+    return new_game
+
+@app.post("/games/bulk")
+async def create_games_bulk(games_data: List[ScrapedGame]):
+    """
+    Creates many games at once. Games that already exist are skipped.
+
+    Teams are resolved in one pass, new games are inserted in a single
+    statement and stats/ranks are refreshed once per affected team.
+    """
+    if not games_data:
+        return {"created": 0, "skipped": 0}
+
+    created = await ingest_games(games_data)
+    return {"created": len(created), "skipped": len(games_data) - len(created)}
+
+# Declared before /games/{game_id} so "bulk" isn't taken for an id
+@app.put("/games/bulk")
+async def upsert_games_bulk(games_data: List[ScrapedGame]):
+    """
+    Creates or overwrites many games, matched by time and location. Meant
+    for clients that only send what changed since their last sync: existing
+    games take the new score, teams and info, and stats are corrected by the
+    difference.
+    """
+    if not games_data:
+        return {"created": 0, "updated": 0, "unchanged": 0}
+
+    created = await ingest_games(games_data)
+
+    existing = {}
+    for game_data in games_data:
+        key = game_key(parse_game_time(game_data.game_time), format_location(game_data.field_name, game_data.field_num))
+        if key not in created:
+            existing.setdefault(key, game_data)
+
+    updated = await update_games(existing) if existing else 0
+    return {"created": len(created), "updated": updated, "unchanged": len(existing) - updated}
+
+async def update_games(games_data: Dict[Tuple[str, str], ScrapedGame]) -> int:
+    """
+    Overwrites the stored games at the given (gameTime, location) keys where
+    they differ and applies the stats difference. Returns how many changed.
+    """
+    # Already resolved by ingest_games, so these are cache hits
+    teams_by_name = await resolve_teams(list(games_data.values()))
+
+    stored = await db.game.find_many(where={"OR": [
+        {"gameTime": parse_game_time(game_data.game_time), "location": format_location(game_data.field_name, game_data.field_num)}
+        for game_data in games_data.values()
+    ]})
+
+    deltas = {}
+    updated = 0
+    for game in stored:
+        game_data = games_data.get(game_key(game.gameTime, game.location))
+
+        while game is not None and game_data is not None:
+            data = {
+                "homeScore": game_data.home_score,
+                "awayScore": game_data.away_score,
+                "homeTeamId": teams_by_name[game_data.home_team].id,
+                "awayTeamId": teams_by_name[game_data.away_team].id,
+                "status": get_game_status(game_data),
+                "info": game_data.info
             }
-        }
+            # A game still listed as a fixture somewhere never loses its result
+            if game.status == GameStatus.FINISHED and data["status"] != GameStatus.FINISHED:
+                data.update(homeScore=game.homeScore, awayScore=game.awayScore, status=game.status)
+            if all(getattr(game, field) == value for field, value in data.items()):
+                break
+
+            updated_game = await replace_game(game, data)
+            if updated_game is not None:
+                for team_id, delta in game_change_deltas(game, updated_game).items():
+                    add_stats(deltas.setdefault(team_id, empty_stats()), delta)
+                updated += 1
+                break
+
+            # Another write changed it since it was read, start over from
+            # the row as it is now
+            game = await db.game.find_unique(where={"id": game.id})
+
+    if updated:
+        refresh_scheduler.mark(team_ids=await apply_stats(deltas))
+        data_changed()
+    return updated
+
+# What a game's stats contribution depends on
+GAME_RESULT_FIELDS = ("homeScore", "awayScore", "homeTeamId", "awayTeamId", "status")
+
+async def replace_game(game: Game, data: dict) -> Optional[Game]:
+    """
+    Writes `data` over a game read earlier, but only if its result and
+    teams are still as read, and returns the game as written. Returns None
+    if another write changed them in between, so two overlapping writers
+    can never both apply the stats difference of the same change.
+    """
+    changed = await db.game.update_many(
+        where={"id": game.id, **{field: getattr(game, field) for field in GAME_RESULT_FIELDS}},
+        data=data
     )
+    if not changed:
+        return None
+    return game.model_copy(update=data)
+
+# Deletes the games at the (gameTime, location) pairs in $1 and returns the
+# deleted rows, so concurrent deletes never both take out the same result
+DELETE_GAMES_QUERY = """
+DELETE FROM "Game" AS g
+USING jsonb_to_recordset($1::jsonb) AS k("gameTime" timestamp, "location" text)
+WHERE g."gameTime" = k."gameTime" AND g."location" = k."location"
+RETURNING g.*
+"""
+
+@app.post("/games/bulk/delete")
+async def delete_games_bulk(keys: List[GameKey]):
+    """
+    Deletes many games by time and location and takes their results back
+    out of the stats. Keys that match no game are ignored.
+    """
+    if not keys:
+        return {"deleted": 0}
+
+    unique_keys = {game_key(parse_game_time(key.game_time), format_location(key.field_name, key.field_num)) for key in keys}
+    deleted = await db.query_raw(DELETE_GAMES_QUERY, json.dumps([
+        {"gameTime": game_time, "location": location} for game_time, location in unique_keys
+    ]), model=Game)
+
+    deltas = {}
+    for game in deleted:
+        for team_id, delta in game_stats_deltas(game, sign=-1).items():
+            add_stats(deltas.setdefault(team_id, empty_stats()), delta)
+
+    if deleted:
+        refresh_scheduler.mark(team_ids=await apply_stats(deltas))
+        data_changed()
+    return {"deleted": len(deleted)}
+
+# Inserts the games in $1 (a JSON array) and returns only the rows this
+# statement created, so concurrent ingests never both count the same game
+INSERT_GAMES_QUERY = """
+INSERT INTO "Game" ("gameTime", "location", "homeScore", "awayScore", "homeTeamId", "awayTeamId", "status", "info")
+SELECT g."gameTime", g."location", g."homeScore", g."awayScore", g."homeTeamId", g."awayTeamId", g."status"::"GameStatus", g."info"
+FROM jsonb_to_recordset($1::jsonb) AS g(
+    "gameTime" timestamp, "location" text, "homeScore" int, "awayScore" int,
+    "homeTeamId" int, "awayTeamId" int, "status" text, "info" text
+)
+ON CONFLICT ("gameTime", "location") DO NOTHING
+RETURNING *
+"""
+
+async def ingest_games(games_data: List[ScrapedGame]) -> Dict[Tuple[str, str], ScrapedGame]:
+    """
+    Inserts the games that don't exist yet and applies their stats. Returns
+    the games that were created, keyed by (gameTime, location). Shared by
+    the bulk endpoint and the ingest queue workers.
+    """
+    teams_by_name = await resolve_teams(games_data)
+
+    # Collapse duplicates inside the batch on the same key create_game uses
+    new_games = {}
+    for game_data in games_data:
+        new_games.setdefault(game_key(parse_game_time(game_data.game_time), format_location(game_data.field_name, game_data.field_num)), game_data)
+
+    inserted = await db.query_raw(INSERT_GAMES_QUERY, json.dumps([
+        {
+            "gameTime": game_time,
+            "location": location,
+            "homeScore": game_data.home_score,
+            "awayScore": game_data.away_score,
+            "homeTeamId": teams_by_name[game_data.home_team].id,
+            "awayTeamId": teams_by_name[game_data.away_team].id,
+            "status": get_game_status(game_data).value,
+            "info": game_data.info
+        }
+        for (game_time, location), game_data in new_games.items()
+    ]), model=Game)
 
-    away_team = await db.team.upsert(
+    deltas = {}
+    for game in inserted:
+        for team_id, delta in game_stats_deltas(game).items():
+            add_stats(deltas.setdefault(team_id, empty_stats()), delta)
+
+    if inserted:
+        await apply_stats(deltas)
+        refresh_scheduler.mark(divs=[team.div for team in teams_by_name.values()])
+        data_changed()
+
+    created = {key: new_games[key] for key in (game_key(game.gameTime, game.location) for game in inserted)}
+    GAMES_INGESTED.inc(len(created), outcome="created")
+    GAMES_INGESTED.inc(len(games_data) - len(created), outcome="exists")
+    return created
+
+async def apply_ingest_batch(games_data: List[ScrapedGame]) -> List[str]:
+    """
+    Applies a batch from the ingest queue. Each job's result is "created" or
+    "exists".
+    """
+    created = await ingest_games(games_data)
+    return [
+        "created" if created.get(game_key(parse_game_time(game_data.game_time), format_location(game_data.field_name, game_data.field_num))) is game_data else "exists"
+        for game_data in games_data
+    ]
+
+ingest_queue = IngestQueue(apply_ingest_batch, max_size=1000, workers=2, batch_size=100)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Reports the status of a queued ingest job.
+    """
+    job = ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+def game_key(game_time: datetime, location: str) -> Tuple[str, str]:
+    """
+    The natural key of a game as stored: gameTime in UTC, rounded to the
+    millisecond precision of the column.
+    """
+    if game_time.tzinfo is not None:
+        game_time = game_time.astimezone(timezone.utc).replace(tzinfo=None)
+    game_time += timedelta(microseconds=500)
+    return (game_time.replace(microsecond=game_time.microsecond // 1000 * 1000).isoformat(timespec="milliseconds"), location)
+
+async def resolve_team(name: str, primary_color: str, secondary_color: str, div: int) -> CachedTeam:
+    """
+    Returns the team with the given name, creating it in `div` if it's new and
+    updating its colors if they changed. Known teams with unchanged colors
+    cost no query.
+    """
+    cached_team = team_cache.get(name)
+    if cached_team is not None:
+        if (cached_team.primary_color, cached_team.secondary_color) == (primary_color, secondary_color):
+            return cached_team
+
+        team = await db.team.update(
+            where={"id": cached_team.id},
+            data={"primaryColor": primary_color, "secondaryColor": secondary_color}
+        )
+        if team:
+            return team_cache.put(team)
+        team_cache.forget(cached_team.id)
+
+    team = await db.team.upsert(
         where={
-            "name": game_data.away_team
+            "name": name
         },
         data={
             "create": {
-                "name": game_data.away_team,
-                "primaryColor": game_data.away_team_primary_color,
-                "secondaryColor": game_data.away_team_secondary_color,
-                "div": 0
+                "name": name,
+                "primaryColor": primary_color,
+                "secondaryColor": secondary_color,
+                "div": div
             },
             "update": {
-                "primaryColor": game_data.away_team_primary_color,
-                "secondaryColor": game_data.away_team_secondary_color,
+                "primaryColor": primary_color,
+                "secondaryColor": secondary_color,
             }
         }
     )
+    return team_cache.put(team)
 
-
-    current_status = GameStatus.SCHEDULED
-
+async def resolve_teams(games_data: List[ScrapedGame]) -> Dict[str, CachedTeam]:
+    """
+    Returns a name -> team map for every team in the given games, creating
+    missing teams and updating changed colors in as few queries as possible.
+    Teams already in team_cache with the same colors cost nothing.
+    """
+    wanted = {}
+    for game_data in games_data:
+        # As in create_game, new home teams go in div 1 and new away teams in div 0
+        for name, primary_color, secondary_color, div in (
+            (game_data.home_team, game_data.home_team_primary_color, game_data.home_team_secondary_color, 1),
+            (game_data.away_team, game_data.away_team_primary_color, game_data.away_team_secondary_color, 0),
+        ):
+            if name in wanted:
+                div = wanted[name][2]
+            wanted[name] = (primary_color, secondary_color, div)
+
+    resolved = {}
+    for name, (primary_color, secondary_color, _) in wanted.items():
+        cached_team = team_cache.get(name)
+        if cached_team is not None and (cached_team.primary_color, cached_team.secondary_color) == (primary_color, secondary_color):
+            resolved[name] = cached_team
+
+    unresolved = [name for name in wanted if name not in resolved]
+    if not unresolved:
+        return resolved
+
+    existing = {team.name: team for team in await db.team.find_many(where={"name": {"in": unresolved}})}
+
+    missing = [name for name in unresolved if name not in existing]
+    if missing:
+        await db.team.create_many(
+            data=[
+                {
+                    "name": name,
+                    "primaryColor": wanted[name][0],
+                    "secondaryColor": wanted[name][1],
+                    "div": wanted[name][2]
+                }
+                for name in missing
+            ],
+            skip_duplicates=True
+        )
+
+    changed = [
+        team for team in existing.values()
+        if (team.primaryColor, team.secondaryColor) != wanted[team.name][:2]
+    ]
+    if changed:
+        async with db.batch_() as batcher:
+            for team in changed:
+                batcher.team.update(
+                    where={"id": team.id},
+                    data={
+                        "primaryColor": wanted[team.name][0],
+                        "secondaryColor": wanted[team.name][1],
+                    }
+                )
+
+    if missing or changed:
+        data_changed()
+        existing = {team.name: team for team in await db.team.find_many(where={"name": {"in": unresolved}})}
+
+    for team in existing.values():
+        resolved[team.name] = team_cache.put(team)
+    return resolved
+
+def format_location(field_name: str, field_num: int) -> str:
+    return f"{field_name} - Field {field_num}"
+
+def parse_game_time(game_time: str) -> datetime:
+    parsed = datetime.fromisoformat(game_time.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def get_game_status(game_data: ScrapedGame) -> GameStatus:
     if game_data.home_score is not None and game_data.away_score is not None:
-        current_status = GameStatus.FINISHED
-
-    new_game = await db.game.create(data={
-        "gameTime": game_data.game_time,
-        "location": f"{game_data.field_name} - Field {game_data.field_num}",
-        "homeScore": game_data.home_score,
-        "awayScore": game_data.away_score,
-        "homeTeamId": home_team.id,
-        "awayTeamId": away_team.id,
-        "status": current_status,
-        "info": game_data.info
-    })
+        return GameStatus.FINISHED
+    return GameStatus.SCHEDULED
 
-    await refresh_stats(home_team.id)
-    await refresh_stats(away_team.id)
-    return new_game
 @app.get("/games")
-async def get_games(date: Optional[str] = None, limit: Optional[int] = 10, sort_by: Optional[str] = None, team_id: Optional[int] = None):
+async def get_games(
+    request: Request,
+    response: Response,
+    date: Optional[str] = None,
+    limit: Optional[int] = 10,
+    sort_by: Optional[str] = None,
+    team_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    status: Optional[GameStatus] = None,
+    div: Optional[int] = None
+):
     """
     Retrieves all games from the database.
+
+    `from` (inclusive) and `to` (exclusive) restrict gameTime to a range and
+    sort by gameTime unless sort_by says otherwise. Times without an offset
+    are taken as UTC. The older `date` parameter is still accepted: games
+    after it, or before it with a leading "-". `status` and `div` (either
+    team in the division) narrow the results further.
+
+    When sorted by gameTime (either direction) the results are paged with
+    keyset pagination on (gameTime, id): if there are more games, the
+    X-Next-Cursor header holds an opaque cursor to pass back as `cursor`.
+    A cursor implies its own sort order, so sort_by can be left out.
+
+    `fields` is a comma separated list of game fields to return. Embedded
+    teams are requested as `homeTeam`/`awayTeam` (id and name) or field by
+    field, e.g. `homeTeam.primaryColor`. By default every game field is
+    returned with slim embedded teams.
     """
+    game_fields, team_fields = parse_game_fields(fields)
+    time_range = game_time_range(date, start, end)
+    if (start or end) and not sort_by and not cursor:
+        sort_by = "gameTime"
+
+    async def load():
+        games, next_cursor = await find_games(time_range, limit, sort_by, team_id, cursor, include=tuple(team_fields), status=status, div=div)
+        return serialize([project_game(game, game_fields, team_fields) for game in games]), next_cursor
+
+    result = await cached_read(
+        request,
+        response,
+        ("games", tuple(sorted(time_range.items())), min(limit, 100), sort_by, team_id, cursor, status, div, game_fields, tuple(team_fields.items())),
+        load
+    )
+    if isinstance(result, Response):
+        return result
+
+    body, next_cursor = result
+    headers = {"ETag": response.headers["ETag"]}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def game_time_range(date: Optional[str], start: Optional[str], end: Optional[str]) -> Dict[str, datetime]:
+    """
+    Combines the legacy `date` bound with from/to into a Prisma gameTime
+    filter, e.g. {"gte": start, "lt": end}. All values are UTC. Malformed
+    times are a 400, whichever parameter they're in.
+    """
+    time_range = {}
+    if date:
+        if date.startswith("-"):
+            time_range["lt"] = parse_time_param(date[1:], "date")
+        else:
+            time_range["gt"] = parse_time_param(date, "date")
+    if start:
+        time_range["gte"] = parse_time_param(start, "from")
+    if end:
+        end_time = parse_time_param(end, "to")
+        time_range["lt"] = min(time_range["lt"], end_time) if "lt" in time_range else end_time
+
+    if start and end and time_range["gte"] >= time_range["lt"]:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    return time_range
+
+DATETIME_ADAPTER = pydantic.TypeAdapter(datetime)
+
+def parse_time_param(value: str, name: str) -> datetime:
+    try:
+        return as_utc(DATETIME_ADAPTER.validate_python(value))
+    except pydantic.ValidationError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, expected an ISO 8601 datetime")
+
+def as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+GAME_FIELDS = ("id", "gameTime", "location", "status", "homeTeamId", "homeScore", "awayTeamId", "awayScore", "info")
+TEAM_FIELDS = ("id", "name", "primaryColor", "secondaryColor", "div", "gf", "ga", "gd", "w", "l", "d", "points", "gamesPlayed", "rank")
+EMBEDDED_TEAM_FIELDS = ("id", "name")
+
+def parse_game_fields(fields: Optional[str]) -> Tuple[Tuple[str, ...], Dict[str, Tuple[str, ...]]]:
+    """
+    Parses the `fields` parameter of GET /games into the game fields and
+    the fields of each embedded team to return.
+    """
+    if not fields:
+        return GAME_FIELDS, {"homeTeam": EMBEDDED_TEAM_FIELDS, "awayTeam": EMBEDDED_TEAM_FIELDS}
+
+    game_fields = {}
+    team_fields = {}
+    for field in fields.split(","):
+        name, _, team_field = field.strip().partition(".")
+        if name in GAME_FIELDS and not team_field:
+            game_fields[name] = None
+        elif name in ("homeTeam", "awayTeam") and (not team_field or team_field in TEAM_FIELDS):
+            selected = team_fields.setdefault(name, {})
+            selected.update(dict.fromkeys([team_field] if team_field else EMBEDDED_TEAM_FIELDS))
+        else:
+            raise HTTPException(status_code=400, detail=f"Invalid field: {field.strip()}")
+
+    return tuple(game_fields), {name: tuple(selected) for name, selected in team_fields.items()}
+
+def project_game(game: Game, game_fields: Tuple[str, ...], team_fields: Dict[str, Tuple[str, ...]]) -> dict:
+    row = {field: getattr(game, field) for field in game_fields}
+    for relation, selected in team_fields.items():
+        team = getattr(game, relation)
+        row[relation] = {field: getattr(team, field) for field in selected} if team else None
+    return row
+
+def serialize(content) -> bytes:
+    """
+    Encodes plain dicts/lists to JSON with orjson. Much cheaper than going
+    through jsonable_encoder and pydantic for large listings.
+    """
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+async def find_games(
+    time_range: Dict[str, datetime],
+    limit: int,
+    sort_by: Optional[str],
+    team_id: Optional[int],
+    cursor: Optional[str],
+    include: Tuple[str, ...] = ("homeTeam", "awayTeam"),
+    status: Optional[GameStatus] = None,
+    div: Optional[int] = None
+):
+    """
+    Runs the query behind GET /games and returns (games, next_cursor).
+    Only the relations in `include` are loaded.
+    """
+    include = {relation: True for relation in include} or None
 
     if limit < 0:
         raise HTTPException(status_code=400, detail="Limit cannot be negative")
@@ -202,47 +891,170 @@ async def get_games(date: Optional[str] = None, limit: Optional[int] = 10, sort_
 
 
     where_clause={}
-    if date:
-        if date[0] == '-':
-            bound = 'lt'
-            date = date[1:]
-        else:
-            bound = 'gt'
-        date = datetime.fromisoformat(date.replace('Z', '+00:00'))
-        where_clause['gameTime'] = {
-            bound : date
-        }
+    if time_range:
+        where_clause['gameTime'] = time_range
+    if status:
+        where_clause['status'] = status
+
+    after = None
+    if cursor:
+        after_time, after_id, direction = decode_cursor(cursor)
+        if sort_by_clause and sort_by_clause != {"gameTime": direction}:
+            raise HTTPException(status_code=400, detail="Cursor does not match sort_by")
+        sort_by_clause = {"gameTime": direction}
+        after = (after_time, after_id)
+
+    # Fetch one extra row to know whether there is a next page
+    paginated = list(sort_by_clause) == ["gameTime"]
+    take = limit + 1 if paginated and limit else limit
+
+    if team_id and set(sort_by_clause) <= {"gameTime"}:
+        # Resolve the page of ids with an index-friendly UNION, then load the rows
+        ids = [row["id"] for row in await db.query_raw(*team_games_query(
+            team_id,
+            time_range=time_range,
+            direction=sort_by_clause.get("gameTime", "asc"),
+            limit=take,
+            after=after,
+            status=status,
+            div=div
+        ))]
+        games = await db.game.find_many(
+            where={"id": {"in": ids}},
+            include=include
+        )
+        position = {game_id: i for i, game_id in enumerate(ids)}
+        games.sort(key=lambda game: position[game.id])
+    else:
+        conditions = []
+        if team_id:
+            conditions.append({'OR': [
+                {
+                    'homeTeamId': team_id
+                },
+                {
+                    'awayTeamId': team_id
+                }
+            ]})
+        if div is not None:
+            conditions.append({'OR': [
+                {'homeTeam': {'is': {'div': div}}},
+                {'awayTeam': {'is': {'div': div}}}
+            ]})
+
+        order = sort_by_clause
+        if paginated:
+            direction = sort_by_clause["gameTime"]
+            order = [{"gameTime": direction}, {"id": direction}]
+
+            if after:
+                op = "lt" if direction == "desc" else "gt"
+                conditions.append({
+                    'OR': [
+                        {'gameTime': {op: after[0]}},
+                        {'gameTime': after[0], 'id': {op: after[1]}}
+                    ]
+                })
+
+        if conditions:
+            where_clause['AND'] = conditions
+
+        games = await db.game.find_many(
+            where=where_clause,
+            take=take,
+            order=order,
+            include=include
+        )
+
+    next_cursor = None
+    if paginated and len(games) > limit:
+        games = games[:limit]
+        next_cursor = encode_cursor(games[-1], sort_by_clause["gameTime"])
+
+    return games, next_cursor
+
+def encode_cursor(game: Game, direction: str) -> str:
+    """
+    Returns an opaque cursor pointing just after the given game.
+    """
+    payload = json.dumps([game.gameTime.isoformat(), game.id, direction])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        game_time, game_id, direction = json.loads(payload)
+        if direction not in ("asc", "desc"):
+            raise ValueError(direction)
+        return datetime.fromisoformat(game_time), int(game_id), direction
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+RANGE_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+def team_games_query(
+    team_id: int,
+    time_range: Optional[Dict[str, datetime]] = None,
+    direction: str = "asc",
+    limit: int = 10,
+    after: Optional[Tuple[datetime, int]] = None,
+    status: Optional[GameStatus] = None,
+    div: Optional[int] = None
+):
+    """
+    Builds the query for the ids of a team's games ordered by gameTime.
 
-    if team_id:
-        where_clause['OR'] = [
-            {
-                'homeTeamId': team_id
-            },
-            {
-                'awayTeamId': team_id
-            }
-        ]
+    A single OR over homeTeamId/awayTeamId can't walk an index in gameTime
+    order, so each side is read from its own (teamId, gameTime) index,
+    limited, and the two short lists are merged. `time_range` is a gameTime
+    filter such as {"gte": start, "lt": end}.
+    """
+    direction = "DESC" if direction == "desc" else "ASC"
+    params = [team_id]
+    condition = ""
 
+    for op, value in (time_range or {}).items():
+        params.append(to_db_timestamp(value))
+        condition += f' AND "gameTime" {RANGE_OPERATORS[op]} ${len(params)}::timestamp'
 
-    games = await db.game.find_many(
-        where=where_clause,
-        take=limit,
-        order=sort_by_clause,
-        include={
-            "homeTeam": True,
-            "awayTeam": True
-        }
-    )
+    if status:
+        params.append(status.value)
+        condition += f' AND "status" = ${len(params)}::"GameStatus"'
+
+    if div is not None:
+        params.append(div)
+        condition += f' AND EXISTS (SELECT 1 FROM "Team" WHERE "Team"."div" = ${len(params)} AND "Team"."id" IN ("homeTeamId", "awayTeamId"))'
+
+    if after:
+        params.extend([to_db_timestamp(after[0]), after[1]])
+        condition += f' AND ("gameTime", "id") {"<" if direction == "DESC" else ">"} (${len(params) - 1}::timestamp, ${len(params)})'
+
+    params.append(limit)
+    limit_param = f"${len(params)}"
 
-    return games
+    side = '(SELECT "id", "gameTime" FROM "Game" WHERE "{column}" = $1' + condition + f' ORDER BY "gameTime" {direction} LIMIT {limit_param})'
+    query = (
+        f'SELECT "id" FROM ({side.format(column="homeTeamId")} UNION {side.format(column="awayTeamId")}) AS games '
+        f'ORDER BY "gameTime" {direction}, "id" {direction} LIMIT {limit_param}'
+    )
+    return (query, *params)
 
+def to_db_timestamp(value: datetime) -> str:
+    """
+    Formats a datetime for comparison with a timestamp column, which Prisma
+    stores in UTC. Naive datetimes are taken to be UTC already.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
 
 @app.get("/games/{game_id}")
-async def get_game(game_id: int):
+async def get_game(request: Request, response: Response, game_id: int):
     """
     Retrieves a specific game by ID from the database.
     """
-    return await db.game.find_unique(where={"id": game_id})
+    return await cached_read(request, response, ("game", game_id), lambda: db.game.find_unique(where={"id": game_id}))
 
 @app.put("/games/{game_id}")
 async def update_game(game_id: int, game_data: ScrapedGame):
@@ -251,65 +1063,40 @@ async def update_game(game_id: int, game_data: ScrapedGame):
     """
     existing_game = await db.game.find_unique(where={"id": game_id})
 
-    old_home_team_id = existing_game.homeTeamId
-    old_away_team_id = existing_game.awayTeamId
-
     if not existing_game:
         return {"message": "Game not found"}
 
-    home_team = await db.team.upsert(
-        where={
-            "name": game_data.home_team
-        },
-        data={
-            "create": {
-                "name": game_data.home_team,
-                "primaryColor": game_data.home_team_primary_color,
-                "secondaryColor": game_data.home_team_secondary_color,
-                "div": 1
-            },
-            "update": {
-                "primaryColor": game_data.home_team_primary_color,
-                "secondaryColor": game_data.home_team_secondary_color,
-            }
-        }
-    )
+    home_team = await resolve_team(game_data.home_team, game_data.home_team_primary_color, game_data.home_team_secondary_color, 1)
+    away_team = await resolve_team(game_data.away_team, game_data.away_team_primary_color, game_data.away_team_secondary_color, 1)
 
-    away_team = await db.team.upsert(
-        where={
-            "name": game_data.away_team
-        },
-        data={
-            "create": {
-                "name": game_data.away_team,
-                "primaryColor": game_data.away_team_primary_color,
-                "secondaryColor": game_data.away_team_secondary_color,
-                "div": 1
-            },
-            "update": {
-                "primaryColor": game_data.away_team_primary_color,
-                "secondaryColor": game_data.away_team_secondary_color
-            }
-        }
-    )  
+    data = {
+        "gameTime": parse_game_time(game_data.game_time),
+        "location": format_location(game_data.field_name, game_data.field_num),
+        "homeScore": game_data.home_score,
+        "awayScore": game_data.away_score,
+        "homeTeamId": home_team.id,
+        "awayTeamId": away_team.id,
+        "status": get_game_status(game_data),
+        "info": game_data.info
+    }
 
-    updated_game = await db.game.update(
-        where={"id": game_id},
-        data={
-            "gameTime": game_data.game_time,
-            "location": f"{game_data.field_name} - Field {game_data.field_num}",
-            "homeScore": game_data.home_score,
-            "awayScore": game_data.away_score,
-            "homeTeamId": home_team.id,
-            "awayTeamId": away_team.id,
-            "info": game_data.info
-        }
-    )
-    await refresh_stats(old_home_team_id)
-    await refresh_stats(old_away_team_id)
-    await refresh_stats(home_team.id)
-    await refresh_stats(away_team.id)
-    return updated_game
+    # Conditional on the row as read, so an overlapping write to the same
+    # game can't make both apply their stats difference against it
+    updated_game = None
+    while updated_game is None:
+        try:
+            updated_game = await replace_game(existing_game, data)
+        except UniqueViolationError:
+            data_changed()
+            raise HTTPException(status_code=409, detail="Another game already exists at that time and location")
+        if updated_game is None:
+            existing_game = await db.game.find_unique(where={"id": game_id})
+            if not existing_game:
+                return {"message": "Game not found"}
+
+    refresh_scheduler.mark(team_ids=await apply_stats(game_change_deltas(existing_game, updated_game)))
+    data_changed()
+    return await db.game.find_unique(where={"id": game_id})
 
 @app.delete("/games/{game_id}")
 async def delete_game(game_id: int):
@@ -317,17 +1104,221 @@ async def delete_game(game_id: int):
     Deletes a game from the database.
     """
     deleted_game = await db.game.delete(where={"id": game_id})
+
+    if deleted_game:
+        refresh_scheduler.mark(team_ids=await apply_stats(game_stats_deltas(deleted_game, sign=-1)))
+    data_changed()
     return deleted_game
 
 
 
 
 
+EXPORT_CHUNK_SIZE = 500
+GAME_EXPORT_FIELDS = ["id", "gameTime", "location", "status", "homeTeamId", "homeScore", "awayTeamId", "awayScore", "info"]
+TEAM_EXPORT_FIELDS = ["id", "name", "div", "primaryColor", "secondaryColor", "rank", "points", "gamesPlayed", "w", "l", "d", "gf", "ga", "gd"]
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+@app.get("/export/games")
+async def export_games(
+    format: str = "ndjson",
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    team_id: Optional[int] = None
+):
+    """
+    Streams every matching game as NDJSON or CSV. `from` and `to` work as
+    they do for GET /games.
+    """
+    where = {}
+    time_range = game_time_range(None, start, end)
+    if time_range:
+        where["gameTime"] = time_range
+    if team_id:
+        where["OR"] = [{"homeTeamId": team_id}, {"awayTeamId": team_id}]
+
+    return export_response(db.game, where, GAME_EXPORT_FIELDS, format, "games")
+
+@app.get("/export/teams")
+async def export_teams(format: str = "ndjson", div: Optional[int] = None):
+    """
+    Streams every team, optionally only one division, as NDJSON or CSV.
+    """
+    where = {"div": div} if div is not None else {}
+
+    return export_response(db.team, where, TEAM_EXPORT_FIELDS, format, "teams")
+
+def export_response(actions, where: dict, fields: List[str], format: str, name: str):
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format must be ndjson or csv")
+
+    return StreamingResponse(
+        export_rows(actions, where, fields, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+    )
+
+async def export_rows(actions, where: dict, fields: List[str], format: str):
+    """
+    Walks the table in id order one chunk at a time, so only a single chunk
+    is ever held in memory.
+    """
+    if format == "csv":
+        yield csv_line(fields)
+
+    last_id = None
+    while True:
+        chunk_where = {**where, "id": {"gt": last_id}} if last_id is not None else where
+        records = await actions.find_many(where=chunk_where, order={"id": "asc"}, take=EXPORT_CHUNK_SIZE)
+        if not records:
+            return
+
+        lines = []
+        for record in records:
+            row = [export_value(getattr(record, field)) for field in fields]
+            if format == "csv":
+                lines.append(csv_line(row))
+            else:
+                lines.append(json.dumps(dict(zip(fields, row))) + "\n")
+        yield "".join(lines)
+
+        if len(records) < EXPORT_CHUNK_SIZE:
+            return
+        last_id = records[-1].id
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+def csv_line(row: list) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+@app.get("/standings")
+async def get_standings(request: Request, div: Optional[int] = None):
+    """
+    Retrieves the league table of a division, or of every division, in rank order.
+    """
+    etag = etag_for(("standings", div), version=standings_version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    snapshot = await load_standings()
+    if div is not None:
+        content = snapshot.get(div, [])
+    else:
+        content = [{"div": div, "teams": teams} for div, teams in snapshot.items()]
+
+    return JSONResponse(content=jsonable_encoder(content), headers={"ETag": etag})
+
+@app.post("/refresh_stats")
 async def refresh_stats(team_id: int):
+    """
+    Rebuilds a team's stats from all of its finished games and refreshes its
+    division's ranks. Writes keep stats up to date incrementally, so this is
+    only needed to repair drift.
+    """
+    started = time.perf_counter()
+    stats = await update_team_stats(team_id)
+    STANDINGS_REFRESH_TIME.observe(time.perf_counter() - started, kind="stats")
+    await refresh_rank(team_id)
+    data_changed()
+    standings_changed()
+    return stats
+
+@app.post("/admin/rebuild_stats")
+async def rebuild_stats():
+    """
+    Rebuilds every team's stats from scratch, then every division's ranks.
+    Use after repairing or re-scraping data.
+    """
+    # Games first: every team they reference already exists, so it's
+    # also in the team list read after them
+    games = await db.query_raw(
+        'SELECT "homeTeamId", "awayTeamId", "homeScore", "awayScore" FROM "Game" '
+        'WHERE "status" = \'FINISHED\' AND "homeScore" IS NOT NULL AND "awayScore" IS NOT NULL'
+    )
+    teams = await db.query_raw('SELECT "id" FROM "Team" ORDER BY "id"')
 
+    started = time.perf_counter()
+    team_ids = np.fromiter((team["id"] for team in teams), dtype=np.int64, count=len(teams))
+    columns = {
+        column: np.fromiter((game[column] for game in games), dtype=np.int64, count=len(games))
+        for column in ("homeTeamId", "awayTeamId", "homeScore", "awayScore")
+    }
+    try:
+        stats = compute_league_stats(team_ids, columns["homeTeamId"], columns["awayTeamId"], columns["homeScore"], columns["awayScore"])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=f"{e}, the data changed during the rebuild, try again")
+    compute_seconds = time.perf_counter() - started
+
+    if len(team_ids):
+        await db.execute_raw(
+            f"""
+            UPDATE "Team" AS t
+            SET {", ".join(f'"{field}" = s."{field}"' for field in LEAGUE_STATS_FIELDS)}
+            FROM unnest($1::int[], {", ".join(f"${i}::int[]" for i in range(2, len(LEAGUE_STATS_FIELDS) + 2))})
+                AS s("id", {", ".join(f'"{field}"' for field in LEAGUE_STATS_FIELDS)})
+            WHERE t."id" = s."id"
+            """,
+            team_ids.tolist(),
+            *(stats[field].tolist() for field in LEAGUE_STATS_FIELDS)
+        )
+        await refresh_ranks()
+
+    STANDINGS_REFRESH_TIME.observe(time.perf_counter() - started, kind="rebuild")
+    data_changed()
+    standings_changed()
+    return {"teams": len(team_ids), "games": len(games), "compute_ms": round(compute_seconds * 1000, 3)}
+
+LEAGUE_STATS_FIELDS = ("gf", "ga", "gd", "w", "l", "d", "points", "gamesPlayed")
+
+def compute_league_stats(team_ids: np.ndarray, home_ids: np.ndarray, away_ids: np.ndarray, home_scores: np.ndarray, away_scores: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Computes the stats of every team from columns of finished games in one
+    vectorized pass. team_ids must be sorted; the returned arrays are
+    aligned with it. Raises ValueError if a game has a team that isn't in
+    team_ids, instead of crediting its stats to a neighbour.
+    """
+    size = len(team_ids)
+    home = np.searchsorted(team_ids, home_ids)
+    away = np.searchsorted(team_ids, away_ids)
+    for slots, ids in ((home, home_ids), (away, away_ids)):
+        # searchsorted gives an unknown id the slot it would be inserted at
+        if np.any(slots >= size) or np.any(team_ids[np.minimum(slots, size - 1)] != ids):
+            raise ValueError("A game references a team missing from the team list")
+
+    def per_team(home_values, away_values):
+        totals = np.bincount(home, weights=home_values, minlength=size) + np.bincount(away, weights=away_values, minlength=size)
+        return totals.astype(np.int64)
+
+    home_won = home_scores > away_scores
+    away_won = home_scores < away_scores
+    drawn = home_scores == away_scores
+    played = np.ones(len(home_ids), dtype=np.int64)
+
+    stats = {
+        "gf": per_team(home_scores, away_scores),
+        "ga": per_team(away_scores, home_scores),
+        "w": per_team(home_won, away_won),
+        "l": per_team(away_won, home_won),
+        "d": per_team(drawn, drawn),
+        "gamesPlayed": per_team(played, played),
+    }
+    stats["gd"] = stats["gf"] - stats["ga"]
+    stats["points"] = 3 * stats["w"] + stats["d"]
+    return stats
+
+async def update_team_stats(team_id: int):
+    """
+    Recalculates a team's stats from its finished games, without touching ranks.
+    """
     stats = calculate_stats(await db.game.find_many(where={"AND": [{"status": GameStatus.FINISHED}, {"OR": [{"homeTeamId": team_id}, {"awayTeamId": team_id}]}]}), team_id)
     await db.team.update_many(where={"id": team_id}, data=stats)
-    await refresh_rank(team_id)
     return stats
 
 
@@ -339,59 +1330,98 @@ async def clear_games():
    
     await db.game.delete_many()
     await db.team.delete_many()
+    team_cache.clear()
+    data_changed()
+    standings_changed()
 
     return {"message": "Games and teams cleared"}
 
 def calculate_stats(games : List[Game], team_id: int):
 
-    gf = 0
-    ga = 0
-    gd = 0
-    w = 0
-    l = 0
-    d = 0
-    points = 0
-    gp = 0
-    
+    stats = empty_stats()
+
     for game in games:
-        gp += 1
         if game.homeTeamId == team_id:
-            gf += game.homeScore
-            ga += game.awayScore
-            if game.homeScore > game.awayScore:
-                w += 1
-                points += 3
-            elif game.homeScore < game.awayScore:
-                l += 1
-            else:
-                d += 1
-                points += 1
-        else: 
-            gf += game.awayScore
-            ga += game.homeScore
-            if game.awayScore > game.homeScore:
-                w += 1
-                points += 3
-            elif game.awayScore < game.homeScore:
-                l += 1
-            else:
-                d += 1
-                points += 1
-    gd = gf - ga
-    
-    stats = {
-        "gf": gf,
-        "ga": ga,
-        "gd": gd,
-        "w": w,
-        "l": l,
-        "d": d,
-        "points": points,
-        "gamesPlayed": gp
+            add_stats(stats, stats_delta(game.homeScore, game.awayScore))
+        else:
+            add_stats(stats, stats_delta(game.awayScore, game.homeScore))
+
+    return stats
+
+def empty_stats():
+    return {
+        "gf": 0,
+        "ga": 0,
+        "gd": 0,
+        "w": 0,
+        "l": 0,
+        "d": 0,
+        "points": 0,
+        "gamesPlayed": 0
     }
 
+def add_stats(stats: dict, delta: dict):
+    for key, value in delta.items():
+        stats[key] += value
+    return stats
+
+def stats_delta(goals_for: int, goals_against: int, sign: int = 1):
+    """
+    Returns the contribution of a single result to a team's stats, multiplied
+    by sign (-1 takes the result back out).
+    """
+    stats = empty_stats()
+    stats["gf"] = goals_for * sign
+    stats["ga"] = goals_against * sign
+    stats["gd"] = (goals_for - goals_against) * sign
+    stats["gamesPlayed"] = sign
+
+    if goals_for > goals_against:
+        stats["w"] = sign
+        stats["points"] = 3 * sign
+    elif goals_for < goals_against:
+        stats["l"] = sign
+    else:
+        stats["d"] = sign
+        stats["points"] = sign
+
     return stats
 
+def game_stats_deltas(game: Game, sign: int = 1):
+    """
+    Returns {team_id: delta} for both teams of a game. Games without a final
+    score contribute nothing.
+    """
+    if game.status != GameStatus.FINISHED or game.homeScore is None or game.awayScore is None:
+        return {}
+
+    deltas = {game.homeTeamId: stats_delta(game.homeScore, game.awayScore, sign)}
+    add_stats(deltas.setdefault(game.awayTeamId, empty_stats()), stats_delta(game.awayScore, game.homeScore, sign))
+    return deltas
+
+def game_change_deltas(old_game: Game, new_game: Game):
+    """
+    Returns {team_id: delta} that takes the old result out and applies the
+    new one.
+    """
+    deltas = game_stats_deltas(old_game, sign=-1)
+    for team_id, delta in game_stats_deltas(new_game).items():
+        add_stats(deltas.setdefault(team_id, empty_stats()), delta)
+    return deltas
+
+async def apply_stats(deltas: dict):
+    """
+    Applies {team_id: delta} to the stored stats with atomic increments.
+    Returns the ids of the teams that changed.
+    """
+    changed = []
+    for team_id, delta in deltas.items():
+        data = {key: {"increment": value} for key, value in delta.items() if value}
+        if data:
+            await db.team.update(where={"id": team_id}, data=data)
+            changed.append(team_id)
+    return changed
+
 def get_field_list(model : type[BaseModel]):
     # Returns list of aliases and field names in model
 
@@ -411,13 +1441,66 @@ async def refresh_rank(team_id: int):
     """
 
     team = await db.team.find_unique(where={"id": team_id})
-    
-    sorted_teams = await db.team.find_many(where={"div": team.div}, order=[{"points": "desc"}, {"gd": "desc"}, {"gf": "desc"}])
 
-    for i, team in enumerate(sorted_teams):
-        await db.team.update(where={"id": team.id}, data={"rank": i + 1})
+    started = time.perf_counter()
+    await refresh_ranks([team.div])
+    STANDINGS_REFRESH_TIME.observe(time.perf_counter() - started, kind="rank")
+    data_changed()
+    standings_changed()
+
+    return await db.team.find_many(where={"div": team.div}, order={"rank": "asc"})
+
+# Ranks are positions in the division table, so ties on points/gd/gf are
+# broken by id to keep them unique and stable between refreshes.
+RANK_QUERY = """
+    UPDATE "Team" AS t
+    SET "rank" = ranked.position
+    FROM (
+        SELECT "id", (ROW_NUMBER() OVER (
+            PARTITION BY "div"
+            ORDER BY "points" DESC, "gd" DESC, "gf" DESC, "id"
+        ))::int AS position
+        FROM "Team"
+        {where}
+    ) AS ranked
+    WHERE t."id" = ranked."id" AND t."rank" <> ranked.position
+"""
+
+async def refresh_ranks(divs: Optional[List[int]] = None):
+    """
+    Recomputes the rank of every team in the given divisions (all divisions
+    if None) with a single UPDATE.
+    """
+    if divs is None:
+        return await db.execute_raw(RANK_QUERY.format(where=""))
+    if not divs:
+        return 0
+    return await db.execute_raw(RANK_QUERY.format(where='WHERE "div" = ANY($1::int[])'), list(set(divs)))
+
+async def refresh_ranks_for_teams(team_ids: List[int]):
+    """
+    Recomputes the ranks of every division containing one of the given teams.
+    """
+    return await db.execute_raw(
+        RANK_QUERY.format(where='WHERE "div" IN (SELECT "div" FROM "Team" WHERE "id" = ANY($1::int[]))'),
+        list(set(team_ids))
+    )
+
+async def refresh_standings(team_ids: Set[int], divs: Set[int]):
+    """
+    Refreshes the ranks of the dirty divisions collected by refresh_scheduler.
+    """
+    started = time.perf_counter()
+    if divs:
+        await refresh_ranks(list(divs))
+    if team_ids:
+        await refresh_ranks_for_teams(list(team_ids))
+    STANDINGS_REFRESH_TIME.observe(time.perf_counter() - started, kind="rank")
+    data_changed()
+    standings_changed()
 
-    return sorted_teams
+# Stats are applied inline as deltas, only the rank recomputation is deferred
+refresh_scheduler = RefreshScheduler(refresh_standings, delay=0.5)
 
 
 @app.delete("/wipe_database")
@@ -427,4 +1510,7 @@ async def wipe_database():
     """
     await db.game.delete_many()
     await db.team.delete_many()
+    team_cache.clear()
+    data_changed()
+    standings_changed()
     return {"message": "Database wiped"}
\ No newline at end of file
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable, Optional, Set
+
+
+logger = logging.getLogger("backend.scheduler")
+
+
+class RefreshScheduler:
+    """
+    Collects the teams and divisions whose standings are out of date and
+    refreshes them in the background.
+
+    Writes only mark what they touched. The first mark starts a short debounce
+    window, and everything marked during that window is refreshed together
+    once it ends, so a burst of writes costs one refresh per dirty division
+    instead of one per write.
+    """
+
+    def __init__(self, refresh: Callable[[Set[int], Set[int]], Awaitable[None]], delay: float = 0.5):
+        self._refresh = refresh
+        self.delay = delay
+        self._teams: Set[int] = set()
+        self._divs: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._teams or self._divs)
+
+    def mark(self, team_ids: Iterable[int] = (), divs: Iterable[int] = ()):
+        """
+        Marks teams and divisions as dirty and makes sure a refresh is scheduled.
+        """
+        self._teams.update(team_ids)
+        self._divs.update(divs)
+
+        if self.pending:
+            self._schedule()
+
+    async def flush(self):
+        """
+        Refreshes everything marked so far right away. Used on shutdown and by
+        tests that need up to date standings.
+        """
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+
+        async with self._lock:
+            teams, self._teams = self._teams, set()
+            divs, self._divs = self._divs, set()
+
+            if not teams and not divs:
+                return
+
+            try:
+                await self._refresh(teams, divs)
+            except Exception:
+                # Keep them dirty so the next flush retries
+                self._teams.update(teams)
+                self._divs.update(divs)
+                logger.exception("Standings refresh failed")
+
+        # Marks made while this refresh ran found it already scheduled, and a
+        # failed refresh needs a retry, so go again for whatever is left
+        if self.pending:
+            self._schedule()
+
+    async def close(self):
+        """
+        Cancels the pending timer and flushes whatever is left.
+        """
+        self._cancel()
+        await self.flush()
+        # A failed final flush schedules a retry that would outlive us
+        self._cancel()
+
+    def _schedule(self):
+        # The current task has already passed its sleep, so it can't pick up
+        # new marks and a fresh one is needed
+        loop = asyncio.get_running_loop()
+        task = self._task
+        if task is None or task.done() or task is asyncio.current_task() or task.get_loop() is not loop:
+            self._task = loop.create_task(self._refresh_later())
+
+    def _cancel(self):
+        if self._task is not None and not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._task = None
+
+    async def _refresh_later(self):
+        await asyncio.sleep(self.delay)
+        await self.flush()
@@ -1,23 +1,35 @@
 import aiohttp
-from typing import List, Optional, Dict, Any
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Tuple
 import datetime
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
 TEAM_NAME = os.getenv("TEAM_NAME")
+ETAG_CACHE_SIZE = 256
 
 class LeagueClient:
     def __init__(self, session: aiohttp.ClientSession, base_url: str):
         self.session = session
         self.base_url = base_url
+        # (url, params) -> (etag, body) of the last 200 response
+        self._etag_cache: "OrderedDict[Tuple, Tuple[str, Any]]" = OrderedDict()
 
     async def _get(self, endpoint: str, params: Dict[str, Any] = None) -> Optional[Any]:
         url = f"{self.base_url}{endpoint}"
+        cache_key = (url, tuple(sorted((params or {}).items())))
+        cached = self._etag_cache.get(cache_key)
+        headers = {"If-None-Match": cached[0]} if cached else None
         try:
-            async with self.session.get(url, params=params) as resp:
-                if resp.status == 200:
-                    return await resp.json()
+            async with self.session.get(url, params=params, headers=headers) as resp:
+                if resp.status == 304 and cached:
+                    self._etag_cache.move_to_end(cache_key)
+                    return cached[1]
+                elif resp.status == 200:
+                    body = await resp.json()
+                    self._remember(cache_key, resp.headers.get("ETag"), body)
+                    return body
                 elif resp.status == 404:
                     print(f"⚠️ 404 Not Found: {url}")
                     return None
@@ -28,6 +40,15 @@ class LeagueClient:
             print(f"💥 Connection Error: {e}, for {url} with params {params}")
             return None
 
+    def _remember(self, cache_key: Tuple, etag: Optional[str], body: Any):
+        if not etag:
+            self._etag_cache.pop(cache_key, None)
+            return
+        self._etag_cache[cache_key] = (etag, body)
+        self._etag_cache.move_to_end(cache_key)
+        while len(self._etag_cache) > ETAG_CACHE_SIZE:
+            self._etag_cache.popitem(last=False)
+
     async def get_latest_games(self, team_id: int, limit: int = 5) -> List[Dict]:
         
 
@@ -39,7 +60,7 @@ class LeagueClient:
             "team_id": team["id"],
             "limit": limit,
             "sort_by": "-gameTime",
-            "date": "-"+ datetime.datetime.now().isoformat()
+            "to": current_minute()
         }
 
         games = await self._get("/games", params=params)
@@ -58,7 +79,7 @@ class LeagueClient:
             "team_id": team["id"],
             "limit": limit,
             "sort_by": "gameTime",
-            "date": datetime.datetime.now().isoformat()
+            "from": current_minute()
         }
 
         
@@ -77,3 +98,11 @@ class LeagueClient:
         
         return await self._get(f"/teams", params={"id": team_id})
         
+
+
+def current_minute() -> str:
+    """
+    The current UTC time truncated to the minute. Repeated lookups within a
+    minute send the same query, so they share the backend's cached response.
+    """
+    return datetime.datetime.now(datetime.timezone.utc).replace(second=0, microsecond=0).isoformat()
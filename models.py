@@ -1,7 +1,13 @@
 from pydantic import BaseModel
 import datetime
 from typing import Optional
-from pydantic import Field, ConfigDict
+from pydantic import Field, ConfigDict, field_validator
+
+
+def check_game_time(value: str) -> str:
+    # Kept as the string it came in as, but it has to parse
+    datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value
 
 
 class ScrapedGame(BaseModel):
@@ -20,6 +26,17 @@ class ScrapedGame(BaseModel):
     game_time: str = Field(alias="gameTime")
     info: Optional[str]
 
+    _check_game_time = field_validator("game_time")(check_game_time)
+
+class GameKey(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    field_name: str = Field(alias="fieldName")
+    field_num: int = Field(alias="fieldNum")
+    game_time: str = Field(alias="gameTime")
+
+    _check_game_time = field_validator("game_time")(check_game_time)
+
 class TeamModel(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
 
@@ -0,0 +1,10 @@
+-- Remove duplicate games left by the old check-then-create ingest, keeping
+-- the oldest row. Run POST /refresh_stats for affected teams afterwards.
+DELETE FROM "Game" a
+USING "Game" b
+WHERE a."gameTime" = b."gameTime"
+  AND a."location" = b."location"
+  AND a."id" > b."id";
+
+-- CreateIndex
+CREATE UNIQUE INDEX "Game_gameTime_location_key" ON "Game"("gameTime", "location");
@@ -0,0 +1,8 @@
+-- CreateIndex
+CREATE INDEX "Game_homeTeamId_gameTime_idx" ON "Game"("homeTeamId", "gameTime");
+
+-- CreateIndex
+CREATE INDEX "Game_awayTeamId_gameTime_idx" ON "Game"("awayTeamId", "gameTime");
+
+-- CreateIndex
+CREATE INDEX "Game_status_gameTime_idx" ON "Game"("status", "gameTime");
@@ -0,0 +1,174 @@
+import os
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+
+# Fastest first. The default is the first one that is installed.
+ENGINE_PREFERENCE = ("selectolax", "lxml", "html.parser")
+
+
+class SoupNode:
+    """
+    Wraps a BeautifulSoup tag in the small node API LeagueParser is written
+    against: css, css_first, text, attributes, parent and tag, modelled on
+    selectolax.
+    """
+
+    __slots__ = ("_tag",)
+
+    def __init__(self, tag: Tag):
+        self._tag = tag
+
+    @property
+    def tag(self) -> str:
+        return self._tag.name
+
+    @property
+    def attributes(self) -> Dict[str, str]:
+        # bs4 splits class into a list, selectolax keeps the raw string
+        return {
+            name: " ".join(value) if isinstance(value, list) else value
+            for name, value in self._tag.attrs.items()
+        }
+
+    @property
+    def parent(self) -> Optional["SoupNode"]:
+        parent = self._tag.parent
+        return SoupNode(parent) if parent is not None else None
+
+    def css(self, selector: str) -> List["SoupNode"]:
+        simple = simple_selector(selector)
+        if simple is None:
+            return [SoupNode(tag) for tag in self._tag.select(selector)]
+        return [SoupNode(tag) for tag in self._find_all(*simple)]
+
+    def css_first(self, selector: str) -> Optional["SoupNode"]:
+        simple = simple_selector(selector)
+        if simple is None:
+            tag = self._tag.select_one(selector)
+        else:
+            tag = next(iter(self._find_all(*simple, limit=1)), None)
+        return SoupNode(tag) if tag is not None else None
+
+    def _find_all(self, name: str, classes: Tuple[str, ...], limit: Optional[int] = None) -> List[Tag]:
+        if not classes:
+            return self._tag.find_all(name, limit=limit)
+        if len(classes) == 1:
+            return self._tag.find_all(name, class_=classes[0], limit=limit)
+        # find_all matches a single class, check the others here
+        matches = [
+            tag for tag in self._tag.find_all(name, class_=classes[0])
+            if set(classes) <= set(tag.get("class", ()))
+        ]
+        return matches[:limit] if limit else matches
+
+    def text(self, deep: bool = True, separator: str = "", strip: bool = False) -> str:
+        return self._tag.get_text(separator, strip=strip)
+
+
+@lru_cache(maxsize=64)
+def simple_selector(selector: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    """
+    Splits a `tag` or `tag.class1.class2` selector into (tag, classes), or
+    returns None for anything else. BeautifulSoup's find_all handles these
+    much faster than its CSS engine does.
+    """
+    if not SIMPLE_SELECTOR.fullmatch(selector):
+        return None
+    name, *classes = selector.split(".")
+    return name, tuple(classes)
+
+SIMPLE_SELECTOR = re.compile(r"[a-z][a-z0-9]*(\.[A-Za-z_-][A-Za-z0-9_-]*)*")
+
+
+class LexborNode:
+    """
+    Same API over a selectolax (lexbor) node. Lexbor's css() also matches the
+    node it's called on, while BeautifulSoup only looks at descendants, so
+    the node itself is filtered out here.
+    """
+
+    __slots__ = ("_node",)
+
+    def __init__(self, node):
+        self._node = node
+
+    @property
+    def tag(self) -> str:
+        return self._node.tag
+
+    @property
+    def attributes(self) -> Dict[str, str]:
+        return self._node.attributes
+
+    @property
+    def parent(self) -> Optional["LexborNode"]:
+        parent = self._node.parent
+        return LexborNode(parent) if parent is not None else None
+
+    def css(self, selector: str) -> List["LexborNode"]:
+        mem_id = self._node.mem_id
+        return [LexborNode(node) for node in self._node.css(selector) if node.mem_id != mem_id]
+
+    def css_first(self, selector: str) -> Optional["LexborNode"]:
+        matches = self.css(selector)
+        return matches[0] if matches else None
+
+    def text(self, deep: bool = True, separator: str = "", strip: bool = False) -> str:
+        return self._node.text(deep=deep, separator=separator, strip=strip)
+
+
+def parse_with_soup(features: str) -> Callable[..., SoupNode]:
+    def parse(html: str, only: Optional[Tuple[str, str]] = None) -> SoupNode:
+        # With a strainer the tree builder drops everything outside the
+        # matching elements instead of building it
+        parse_only = SoupStrainer(only[0], class_=only[1]) if only else None
+        return SoupNode(BeautifulSoup(html, features, parse_only=parse_only))
+    return parse
+
+def parse_with_selectolax(html: str, only: Optional[Tuple[str, str]] = None) -> LexborNode:
+    # Lexbor has no partial parsing, but builds the whole tree in C faster
+    # than the other engines build just the parts
+    return LexborNode(LexborHTMLParser(html).root)
+
+
+ENGINES: Dict[str, Callable] = {"html.parser": parse_with_soup("html.parser")}
+if lxml is not None:
+    ENGINES["lxml"] = parse_with_soup("lxml")
+if LexborHTMLParser is not None:
+    ENGINES["selectolax"] = parse_with_selectolax
+
+
+def available_engines() -> List[str]:
+    return [name for name in ENGINE_PREFERENCE if name in ENGINES]
+
+def default_engine() -> str:
+    """
+    SCRAPER_PARSER if set, otherwise the fastest installed engine.
+    """
+    engine = os.getenv("SCRAPER_PARSER")
+    if engine:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown or unavailable parser engine '{engine}', available: {', '.join(available_engines())}")
+        return engine
+    return available_engines()[0]
+
+def parse_html(html: str, engine: Optional[str] = None, only: Optional[Tuple[str, str]] = None):
+    """
+    Parses a page with the given engine (default_engine() if None) and
+    returns its root node. `only` is a (tag, class) pair: engines that
+    support it build just the matching elements and their subtrees.
+    """
+    return ENGINES[engine or default_engine()](html, only)
@@ -0,0 +1,128 @@
+import asyncio
+import random
+from typing import Dict, NamedTuple, Optional
+from urllib.parse import urlsplit
+import aiohttp
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class Page(NamedTuple):
+    url: str
+    status: int
+    # None when the server answered 304 Not Modified
+    text: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+class HostLimiter:
+    """
+    Keeps at least `delay` seconds between the starts of two requests to the
+    same host. Requests to different hosts don't wait for each other.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._next_start: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def wait(self, host: str):
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            loop = asyncio.get_running_loop()
+            wait = self._next_start.get(host, 0) - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_start[host] = loop.time() + self.delay
+
+    def defer(self, host: str, seconds: float):
+        """
+        Pushes the next request to a host back, e.g. for a Retry-After.
+        """
+        loop = asyncio.get_running_loop()
+        self._next_start[host] = max(self._next_start.get(host, 0), loop.time() + seconds)
+
+
+class Fetcher:
+    """
+    Fetches pages concurrently while staying polite to each host.
+
+    Every request first waits for its host's turn in the HostLimiter. Timeouts,
+    connection errors and retryable statuses (429 and 5xx) are retried with
+    exponential backoff and jitter, honouring Retry-After when the server
+    sends one.
+
+    Given the ETag and Last-Modified of an earlier response, `fetch` makes
+    a conditional request and the server can answer 304 without a body.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, delay: float, timeout: float = 30, retries: int = 3, backoff: float = 2.0):
+        self.session = session
+        self.limiter = HostLimiter(delay)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+
+    async def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Optional[Page]:
+        host = urlsplit(url).netloc
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        for attempt in range(self.retries + 1):
+            await self.limiter.wait(host)
+            print(f"Fetching {url}...")
+            try:
+                async with self.session.get(url, headers=headers, timeout=self.timeout) as response:
+                    if response.status in RETRY_STATUSES:
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        if retry_after is not None:
+                            self.limiter.defer(host, retry_after)
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status, message=response.reason or ""
+                        )
+                    response.raise_for_status()
+                    if response.status == 304:
+                        print(f"Not modified: {url}")
+                        return Page(url, 304, None, etag, last_modified)
+
+                    text = await response.text()
+                    print(f"Fetched {url}.")
+                    return Page(
+                        url,
+                        response.status,
+                        text,
+                        response.headers.get("ETag"),
+                        response.headers.get("Last-Modified")
+                    )
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRY_STATUSES:
+                    print(f"Error fetching {url}: {e}")
+                    return None
+                error = e
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt == self.retries:
+                print(f"Error fetching {url}: {error!r}, giving up after {attempt + 1} attempts")
+                return None
+
+            delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+            print(f"Error fetching {url}: {error!r}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Only the delay-seconds form, dates are rare enough to ignore
+    try:
+        return max(float(value), 0.0) if value else None
+    except ValueError:
+        return None
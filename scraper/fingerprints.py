@@ -0,0 +1,75 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+# Everything about a game that can change without it becoming another game
+FINGERPRINT_FIELDS = (
+    "home_score", "away_score", "info",
+    "home_team_primary_color", "home_team_secondary_color",
+    "away_team_primary_color", "away_team_secondary_color",
+)
+
+
+class GameDiff(NamedTuple):
+    # Games to create or overwrite, as parsed
+    upserts: List[Dict[str, Any]]
+    # game_time, field_name and field_num of the games to delete
+    deletes: List[Dict[str, Any]]
+    # The fingerprint store once the diff has been sent
+    store: Dict[str, Dict[str, str]]
+
+
+def game_key(game: Dict[str, Any]) -> str:
+    """
+    A game's natural key: time, field and teams, as a JSON list so the
+    parts can be read back for deletes.
+    """
+    return json.dumps([game["game_time"], game["field_name"], game["field_num"], game["home_team"], game["away_team"]])
+
+def game_fingerprint(game: Dict[str, Any]) -> str:
+    values = json.dumps([game.get(field) for field in FINGERPRINT_FIELDS])
+    return hashlib.sha256(values.encode()).hexdigest()[:16]
+
+def diff_games(store: Dict[str, Dict[str, str]], games_by_source: Dict[str, List[Dict[str, Any]]], now: Optional[datetime] = None) -> GameDiff:
+    """
+    Compares freshly parsed games with the fingerprints of what was last
+    sent. `store` maps game_key to {"hash", "source"}, the page the game was
+    last seen on, and `games_by_source` holds the games of every page that
+    was parsed this run. Pages that weren't parsed are taken as unchanged.
+
+    A stored game is deleted only if its page was parsed, no parsed page
+    has it any more and it hasn't started yet. Games that have started
+    usually just left the schedule before their result was posted, so they
+    are forgotten instead and sent again if they come back.
+    """
+    now = now or datetime.now(timezone.utc)
+    new_store = {key: entry for key, entry in store.items() if entry["source"] not in games_by_source}
+
+    upserts = []
+    seen = set()
+    for source, games in games_by_source.items():
+        for game in games:
+            key = game_key(game)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            fingerprint = game_fingerprint(game)
+            if store.get(key, {}).get("hash") != fingerprint:
+                upserts.append(game)
+            new_store[key] = {"hash": fingerprint, "source": source}
+
+    # The API matches games by time and location only, so a game whose
+    # teams changed is overwritten by its upsert rather than deleted
+    upserted_slots = {(game["game_time"], game["field_name"], game["field_num"]) for game in upserts}
+
+    deletes = []
+    for key in store.keys() - new_store.keys():
+        game_time, field_name, field_num, _, _ = json.loads(key)
+        if (game_time, field_name, field_num) in upserted_slots or datetime.fromisoformat(game_time) <= now:
+            continue
+        deletes.append({"game_time": game_time, "field_name": field_name, "field_num": field_num})
+
+    return GameDiff(upserts, deletes, new_store)
@@ -1,8 +1,8 @@
-from bs4 import BeautifulSoup, Tag
 from typing import List, Dict, Any, Tuple, Optional
 from datetime import datetime
 import re
 import pytz
+from engines import parse_html
 
 # --- Constants ---
 UNKNOWN_STR = "Unknown"
@@ -12,15 +12,23 @@ TIMEZONE = pytz.timezone("US/Eastern")
 # --- Parsing Functions ---
 
 class LeagueParser:
+    """
+    Every parse method takes an optional `engine` (see engines.py) and
+    uses the fastest installed one by default. All engines produce the
+    same records for well-formed pages.
+
+    Only the subtrees the parsers read (the week tables or the division
+    sections) are built, the rest of the page is skipped while parsing.
+    """
 
     @staticmethod
-    def parse_results_page(html_content: str) -> List[Dict[str, Any]]:
+    def parse_results_page(html_content: str, engine: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Parses the "Results" page HTML for completed game scores.
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = parse_html(html_content, engine, only=("table", "generalDataTable"))
 
-        week_results_tables = soup.find_all("table", class_="generalDataTable")
+        week_results_tables = soup.css("table.generalDataTable")
 
         if not week_results_tables:
             print("No 'generalDataTable' tables found on results page.")
@@ -30,12 +38,12 @@ class LeagueParser:
 
         for table in week_results_tables:
             
-            date_span = table.find("span", class_="ui-column-title")
+            date_span = table.css_first("span.ui-column-title")
             if not date_span:
                 print("Skipping table: No date title span found.")
                 continue
             
-            table_date_str = date_span.text.strip()
+            table_date_str = date_span.text().strip()
             table_date_object: Optional[datetime] = None
             try:
                 table_date_object = datetime.strptime(table_date_str, "%A %d %B %Y")
@@ -49,23 +57,23 @@ class LeagueParser:
                 continue
 
             # --- Safely find rows ---
-            rows = table.find_all("tr", class_="ui-widget-content")
+            rows = table.css("tr.ui-widget-content")
             if not rows:
                 print(f"Skipping table for {table_date_str}: No 'ui-widget-content' rows found.")
                 continue
 
             for row in rows:
-                team_rows = row.find_all("tr")
+                team_rows = row.css("tr")
 
                 if len(team_rows) < 2:
                     print("Skipping row: Expected 2 <tr> tags for teams, found less.")
                     continue
 
-                home_team_td = team_rows[0].find("td", class_="teamNames")
-                away_team_td = team_rows[1].find("td", class_="teamNames")
+                home_team_td = team_rows[0].css_first("td.teamNames")
+                away_team_td = team_rows[1].css_first("td.teamNames")
 
                  # --- Extract team colours ---
-                team_logo_tds = row.find_all("td", class_="teamLogos")
+                team_logo_tds = row.css("td.teamLogos")
                 
                 home_team_color_1, home_team_color_2 = (UNKNOWN_STR, UNKNOWN_STR)
                 away_team_color_1, away_team_color_2 = (UNKNOWN_STR, UNKNOWN_STR)
@@ -113,84 +121,91 @@ class LeagueParser:
         return results
 
     @staticmethod
-    def parse_schedule_page(html_content: str) -> List[Dict[str, Any]]:
+    def parse_schedule_page(html_content: str, engine: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Parses the "Schedule" page HTML.
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
+        soup = parse_html(html_content, engine, only=("table", "generalDataTable"))
 
-        fixture_rows = soup.find_all("tr", class_="ui-widget-content")
-        
-        if not fixture_rows:
+        fixtures = []
+        found_rows = False
+
+        for table in soup.css("table.generalDataTable"):
+
+            # --- Extract date, once for all the table's rows ---
+            date_span = table.css_first("span.ui-column-title")
+            date_text = date_span.text().strip() if date_span else UNKNOWN_STR
+
+            for row in table.css("tr.ui-widget-content"):
+                found_rows = True
+                fixture = LeagueParser.parse_fixture_row(row, date_text)
+                if fixture:
+                    fixtures.append(fixture)
+
+        if not found_rows:
             print("No 'ui-widget-content' rows found on schedule page.")
-            return []
 
-        fixtures = []
-        
-        for row in fixture_rows:
-            
-            # --- Extract date ---
-            date_text = UNKNOWN_STR
-            parent_table = row.find_parent("table", class_="generalDataTable")
-            if parent_table:
-                date_span = parent_table.find("span", class_="ui-column-title")
-                if date_span:
-                    date_text = date_span.text.strip()
-
-            # --- Extract team names ---
-            team_name_tds = row.find_all("td", class_="teamNames")
-            
-            if len(team_name_tds) < 2:
-                print("Skipping row: Expected 2 'teamNames' <td>s, found less.")
-                continue
-                
-            home_team_name, extra_info = LeagueParser.extract_team_name(team_name_tds[0])
-            away_team_name, _ = LeagueParser.extract_team_name(team_name_tds[1])
+        return fixtures
 
-            if (home_team_name == "TBD" or away_team_name == "TBD"):
-                print(f"Skipping row: Teams are TBD.")
-                continue
+    @staticmethod
+    def parse_fixture_row(row, date_text: str) -> Optional[Dict[str, Any]]:
+        """
+        Parses one fixture row of the schedule page, or returns None if it
+        should be skipped.
+        """
 
-            # --- Extract team colours ---
-            team_logo_tds = row.find_all("td", class_="teamLogos")
+        # --- Extract team names ---
+        team_name_tds = row.css("td.teamNames")
+        
+        if len(team_name_tds) < 2:
+            print("Skipping row: Expected 2 'teamNames' <td>s, found less.")
+            return None
             
-            home_team_color_1, home_team_color_2 = (UNKNOWN_STR, UNKNOWN_STR)
-            away_team_color_1, away_team_color_2 = (UNKNOWN_STR, UNKNOWN_STR)
-
-            if len(team_logo_tds) >= 2:
-                home_team_color_1, home_team_color_2 = LeagueParser.extract_team_colors(team_logo_tds[0])
-                away_team_color_1, away_team_color_2 = LeagueParser.extract_team_colors(team_logo_tds[1])
-
-            # --- Extract location and time ---
-            field_name, field_number_str = LeagueParser.extract_location(row)
-            time_text = LeagueParser.extract_time_text(row)
-
-            gameDate = LeagueParser.date_and_time_to_iso(date_text, time_text)
-
-            fixtures.append({
-                "home_team": home_team_name,
-                "home_team_primary_color": home_team_color_1,
-                "home_team_secondary_color": home_team_color_2,
-                "home_score": None,
-                "away_score": None,
-                "away_team": away_team_name,
-                "away_team_primary_color": away_team_color_1,
-                "away_team_secondary_color": away_team_color_2,
-                "info": extra_info,
-                "field_name": field_name,
-                "field_num": field_number_str,
-                "game_time": gameDate
-            })
+        home_team_name, extra_info = LeagueParser.extract_team_name(team_name_tds[0])
+        away_team_name, _ = LeagueParser.extract_team_name(team_name_tds[1])
 
-        return fixtures
+        if (home_team_name == "TBD" or away_team_name == "TBD"):
+            print(f"Skipping row: Teams are TBD.")
+            return None
+
+        # --- Extract team colours ---
+        team_logo_tds = row.css("td.teamLogos")
+        
+        home_team_color_1, home_team_color_2 = (UNKNOWN_STR, UNKNOWN_STR)
+        away_team_color_1, away_team_color_2 = (UNKNOWN_STR, UNKNOWN_STR)
+
+        if len(team_logo_tds) >= 2:
+            home_team_color_1, home_team_color_2 = LeagueParser.extract_team_colors(team_logo_tds[0])
+            away_team_color_1, away_team_color_2 = LeagueParser.extract_team_colors(team_logo_tds[1])
+
+        # --- Extract location and time ---
+        field_name, field_number_str = LeagueParser.extract_location(row)
+        time_text = LeagueParser.extract_time_text(row)
+
+        gameDate = LeagueParser.date_and_time_to_iso(date_text, time_text)
+
+        return {
+            "home_team": home_team_name,
+            "home_team_primary_color": home_team_color_1,
+            "home_team_secondary_color": home_team_color_2,
+            "home_score": None,
+            "away_score": None,
+            "away_team": away_team_name,
+            "away_team_primary_color": away_team_color_1,
+            "away_team_secondary_color": away_team_color_2,
+            "info": extra_info,
+            "field_name": field_name,
+            "field_num": field_number_str,
+            "game_time": gameDate
+        }
 
     @staticmethod
-    def parse_league_table_page(html_content: str) -> List[Dict[str, Any]]:
+    def parse_league_table_page(html_content: str, engine: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Parses the "League Table" (standings) page HTML.
         """
-        soup = BeautifulSoup(html_content, 'html.parser')
-        div_containers = soup.find_all("div", class_="section")
+        soup = parse_html(html_content, engine, only=("div", "section"))
+        div_containers = soup.css("div.section")
 
         if not div_containers:
             print("No 'section' divs found on league table page.")
@@ -199,32 +214,32 @@ class LeagueParser:
         league_table = []
 
         for div in div_containers:
-            div_division_h3 = div.find("h3")
-            div_division = div_division_h3.text.strip() if div_division_h3 else UNKNOWN_STR
+            div_division_h3 = div.css_first("h3")
+            div_division = div_division_h3.text().strip() if div_division_h3 else UNKNOWN_STR
             div_division = int(re.search(r'\d+', div_division).group()) if re.search(r'\d+', div_division) else ERROR_INT
-            table_body = div.find("tbody", class_="ui-datatable-data")
+            table_body = div.css_first("tbody.ui-datatable-data")
             if not table_body:
                 print(f"Skipping division '{div_division}': No table body found.")
                 continue
                 
-            table_rows = table_body.find_all("tr")
+            table_rows = table_body.css("tr")
             if not table_rows:
                 print(f"Skipping division '{div_division}': Table body has no rows.")
                 continue
 
             for row in table_rows:
-                cells = row.find_all("td")
+                cells = row.css("td")
 
                 if len(cells) < 10:
                     print(f"Skipping row in '{div_division}': Expected 10 cells, found {len(cells)}.")
                     continue
 
-                def safe_get_text(cell: Tag) -> str:
-                    return cell.text.strip()
+                def safe_get_text(cell) -> str:
+                    return cell.text().strip()
                 
-                def safe_get_int(cell: Tag) -> int:
+                def safe_get_int(cell) -> int:
                     try:
-                        return int(cell.text.strip())
+                        return int(cell.text().strip())
                     except ValueError:
                         return ERROR_INT
                 
@@ -250,17 +265,17 @@ class LeagueParser:
         return league_table
 
     @staticmethod
-    def extract_team_score(element: Tag) -> int:
+    def extract_team_score(element) -> int:
         """
         Safely extracts the score from a team's row.
         """
         if not element:
             return ERROR_INT
             
-        team_score_span = element.find("td", class_="teamScores")
+        team_score_span = element.css_first("td.teamScores")
 
         if team_score_span:
-            team_score_text = team_score_span.text.strip()
+            team_score_text = team_score_span.text().strip()
             
             match = re.search(r"\d+", team_score_text)
             if match:
@@ -272,14 +287,14 @@ class LeagueParser:
         return ERROR_INT
 
     @staticmethod
-    def extract_team_colors(element: Tag) -> Tuple[str, str]:
+    def extract_team_colors(element) -> Tuple[str, str]:
         """
         Safely extracts shirt colors from a team's logo <td>.
         """
         if not element:
             return (UNKNOWN_STR, UNKNOWN_STR)
             
-        shirt_span = element.find("span")
+        shirt_span = element.css_first("span")
         
         if not shirt_span:
             return (UNKNOWN_STR, UNKNOWN_STR)
@@ -287,7 +302,7 @@ class LeagueParser:
         color_1_regex = re.compile(r"--shirt-colour-1: ([^;]+)")
         color_2_regex = re.compile(r"--shirt-colour-2: ([^;]+)")
 
-        style_string = shirt_span.get('style', '')
+        style_string = shirt_span.attributes.get('style') or ''
         
         color_1_match = color_1_regex.search(style_string)
         color_1 = color_1_match.group(1).strip() if color_1_match else UNKNOWN_STR
@@ -298,7 +313,7 @@ class LeagueParser:
         return color_1, color_2
 
     @staticmethod
-    def extract_team_name(element: Tag) -> Tuple[str, Optional[str]]:
+    def extract_team_name(element) -> Tuple[str, Optional[str]]:
         """
         Safely extracts team name and extra info (e.g., "3rd Place Match")
         from a team name <td>.
@@ -306,11 +321,11 @@ class LeagueParser:
         if not element:
             return (UNKNOWN_STR, None)
             
-        span_tag = element.find("span")
+        span_tag = element.css_first("span")
         
-        if span_tag and span_tag.get_text(strip=True):
+        if span_tag and span_tag.text(strip=True):
             try:
-                full_text = element.get_text(strip=True)
+                full_text = element.text(strip=True)
                 text_parts = full_text.split("-", 1)
                 
                 if len(text_parts) == 2:
@@ -321,22 +336,22 @@ class LeagueParser:
                     return text_parts[0].strip(), None
             except Exception as e:
                 print(f"Error splitting team name: {e}")
-                return (element.get_text(strip=True), None)
+                return (element.text(strip=True), None)
         else:
-            return element.get_text(strip=True), None
+            return element.text(strip=True), None
 
     @staticmethod
-    def extract_location(element: Tag) -> Tuple[str, str]:
+    def extract_location(element) -> Tuple[str, str]:
         """
         Safely extracts the field name and number from a fixture row <tr>.
         """
         if not element:
             return (UNKNOWN_STR, UNKNOWN_STR)
             
-        location_element = element.find("a", class_="ui-link ui-widget generalLink facilityLink")
+        location_element = element.css_first("a.ui-link.ui-widget.generalLink.facilityLink")
         
         if location_element:
-            location_text = location_element.text.strip()
+            location_text = location_element.text().strip()
             pattern = re.compile(r"^(.+)\s+\((\d+)\)$")
             match = pattern.search(location_text)
             
@@ -351,7 +366,7 @@ class LeagueParser:
         return (UNKNOWN_STR, UNKNOWN_STR)
 
     @staticmethod
-    def extract_time_text(element: Tag) -> str:
+    def extract_time_text(element) -> str:
         """
         Safely extracts the game time from a fixture row <tr>.
         """
@@ -360,7 +375,7 @@ class LeagueParser:
             
         time_regex = re.compile(r"\d{1,2}:\d{2}\s*(?:am|pm)", re.IGNORECASE)
         
-        div_text = element.get_text()
+        div_text = element.text()
         match = time_regex.search(div_text)
         
         if match:
@@ -1,5 +1,7 @@
+import asyncio
+import aiohttp
+import hashlib
 import requests
-import time
 import json
 import re
 from datetime import datetime
@@ -10,20 +12,23 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 from parser import LeagueParser
-import requests_cache
+from fetcher import Fetcher
+from fingerprints import GameDiff, diff_games
 
 
 # --- Constants ---
-CRAWL_DELAY = 15 # seconds
+CRAWL_DELAY = 15 # seconds between requests to the same host
+FETCH_TIMEOUT = 30 # seconds
+FETCH_RETRIES = 3
 UNKNOWN_STR = "Unknown"
 ERROR_INT = -1
 STATE_FILE = "scraper_state.json"
+API_URL = "http://127.0.0.1:8000"
+BULK_BATCH_SIZE = 500
 
 # Load .env
 load_dotenv()
 
-requests_cache.install_cache('http_cache', expire_after=3600)
-
 default_headers = {
     "User-Agent": "BlueLockBot/1.0 (contact: angusmdev@gmail.com)"
 }
@@ -33,22 +38,134 @@ headers = {
 }
 
 
-def fetch_page(session: requests.Session, url: str) -> Optional[str]:
-
-    try:
-        print(f"Fetching {url}...")
-        response = session.get(url)
-
-        if response.from_cache:
-            print("Loaded from cache.")
+def content_hash(content: Any) -> str:
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+async def fetch_and_parse(fetcher: Fetcher, url: str, parse, saved: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[List[Dict[str, Any]]]]:
+    """
+    Fetches a page and parses it in a worker thread, so parsing one page
+    overlaps with waiting for the next.
+
+    `saved` is the page's entry from the state file. Returns the page's new
+    entry and its records, or None for the records if nothing changed since
+    the saved entry: the server answered 304, the page hashes the same, or
+    it parses to the same records (pages can differ only in ads or tokens).
+    """
+    page = await fetcher.fetch(url, saved.get("etag"), saved.get("last_modified"))
+    if page is None:
+        return saved, None
+    if page.not_modified:
+        return saved, None
+
+    entry = {"etag": page.etag, "last_modified": page.last_modified, "hash": content_hash(page.text)}
+    if entry["hash"] == saved.get("hash"):
+        print(f"Unchanged: {url}")
+        return {**saved, **entry}, None
+
+    records = await asyncio.to_thread(parse, page.text)
+    entry["records_hash"] = content_hash(records)
+    if entry["records_hash"] == saved.get("records_hash"):
+        print(f"Unchanged records: {url}")
+        return entry, None
+    return entry, records
+
+async def scrape(league_ids: List[str], page_state: Dict[str, Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]], Dict[str, Dict[str, Any]]]:
+    """
+    Fetches and parses the league table, schedule and results of every
+    league concurrently, skipping pages that haven't changed since
+    `page_state` was saved. Returns (teams, games by page url, new page
+    state), where only the changed pages have games.
+    """
+    pages = []
+    for league_id in league_ids:
+        pages.extend([
+            (os.getenv("LEAGUE_URL") + league_id, LeagueParser.parse_league_table_page),
+            (os.getenv("RESULTS_URL") + league_id, LeagueParser.parse_results_page),
+            (os.getenv("SCHEDULE_URL") + league_id, LeagueParser.parse_schedule_page),
+        ])
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        fetcher = Fetcher(session, delay=CRAWL_DELAY, timeout=FETCH_TIMEOUT, retries=FETCH_RETRIES)
+        parsed = await asyncio.gather(*[
+            fetch_and_parse(fetcher, url, parse, page_state.get(url, {})) for url, parse in pages
+        ])
+
+    teams, games, new_state = [], {}, {}
+    for (url, parse), (entry, records) in zip(pages, parsed):
+        new_state[url] = entry
+        if records is None:
+            continue
+        if parse is LeagueParser.parse_league_table_page:
+            teams.extend(records)
         else:
-            print("Fetched.")
-            time.sleep(CRAWL_DELAY)
+            games[url] = records
+    return teams, games, new_state
 
-        return response.text
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching {url}: {e}")
+def send(method: str, path: str, payload: Any) -> Optional[requests.Response]:
+    try:
+        response = requests.request(method, f'{API_URL}{path}', data=json.dumps(payload))
+    except requests.RequestException as e:
+        print(f"Error sending to {path}: {e}")
         return None
+    print(response.content)
+    return response
+
+def delivered(response: Optional[requests.Response]) -> bool:
+    """
+    Whether a request is done with. Rejections (4xx) count: the API would
+    reject the same record the same way next run, so it is reported and
+    skipped. Server errors and requests that got no response are retried
+    next run.
+    """
+    if response is None or response.status_code >= 500:
+        return False
+    if not response.ok:
+        print(f"Rejected by the API ({response.status_code}), not sending again")
+    return True
+
+def send_in_batches(method: str, path: str, records: List[Dict[str, Any]]) -> bool:
+    """
+    Sends records in batches, falling back to one request per record if a
+    batch is rejected, since a single malformed record fails validation for
+    the whole batch. Returns whether every request was delivered.
+    """
+    ok = True
+    for i in range(0, len(records), BULK_BATCH_SIZE):
+        batch = records[i:i + BULK_BATCH_SIZE]
+        response = send(method, path, batch)
+        if response is not None and 400 <= response.status_code < 500 and len(batch) > 1:
+            for record in batch:
+                ok = delivered(send(method, path, [record])) and ok
+        else:
+            ok = delivered(response) and ok
+    return ok
+
+def post_teams(teams: List[Dict[str, Any]], sent_hashes: Dict[str, str]) -> bool:
+    """
+    Sends the teams whose record differs from the one last sent, recorded
+    by name in `sent_hashes`, and updates it for the ones delivered.
+    """
+    ok = True
+    for team in teams:
+        team_hash = content_hash(team)
+        if sent_hashes.get(team["name"]) == team_hash:
+            continue
+        if delivered(send("POST", "/teams", team)):
+            sent_hashes[team["name"]] = team_hash
+        else:
+            ok = False
+    return ok
+
+def post_games(diff: GameDiff) -> bool:
+    """
+    Sends a game diff to the API: new and changed games are upserted, then
+    removed games are deleted. Returns whether everything was delivered.
+    """
+    print(f"Sending {len(diff.upserts)} new or changed games and {len(diff.deletes)} deletes...")
+    ok = send_in_batches("PUT", "/games/bulk", diff.upserts)
+    return send_in_batches("POST", "/games/bulk/delete", diff.deletes) and ok
 
 def load_state() -> Dict[str, Any]:
     if not os.path.exists(STATE_FILE):
@@ -62,44 +179,35 @@ def main():
     if not os.path.exists("scraped_data"):
         os.makedirs("scraped_data")
 
-    # Check if pages have been pulled recently
+    # Pages are fetched conditionally against the validators and hashes
+    # saved by the last run, so unchanged pages cost one 304 each
     state = load_state()
-    last_run = state.get("last_run")
-    if not last_run or (datetime.now() - datetime.fromisoformat(last_run)).days > 0 or True:
-        session = requests.Session()
-        session.headers.update(headers)
-        
-        league_url = os.getenv("LEAGUE_URL") + os.getenv("LEAGUE_ID")
-        schedule_url = os.getenv("SCHEDULE_URL") + os.getenv("LEAGUE_ID")
-        results_url = os.getenv("RESULTS_URL") + os.getenv("LEAGUE_ID")
-
-        # Fetch pages from the web and save them
-        league_html = fetch_page(session, league_url)
-        schedule_html = fetch_page(session, schedule_url)
-        results_html = fetch_page(session, results_url) 
-
-        # Update state
-        state["last_run"] = datetime.now().isoformat()
-        with open(STATE_FILE, "w") as f:
-            json.dump(state, f, indent=4)
+    # LEAGUE_ID may list several leagues, e.g. "1234,5678"
+    league_ids = [league_id.strip() for league_id in os.getenv("LEAGUE_ID").split(",") if league_id.strip()]
+    league_table, games, page_state = asyncio.run(scrape(league_ids, state.get("pages", {})))
+
+    # Only what changed since the last sent state goes to the API
+    sent_teams = dict(state.get("teams", {}))
+    diff = diff_games(state.get("games", {}), games)
+
+    if league_table or diff.upserts or diff.deletes:
+        print("Sending game data...")
+        sent = post_teams(league_table, sent_teams)
+        sent = post_games(diff) and sent
     else:
-        print(f"Scraper last ran at {last_run}")
-        return
-            
-    print(schedule_html)
-    league_table = LeagueParser.parse_league_table_page(league_html)
-    schedule = LeagueParser.parse_schedule_page(schedule_html)
-    results = LeagueParser.parse_results_page(results_html)
-
-    print("Sending game data...") 
-    for team in league_table:
-        print(requests.post('http://127.0.0.1:8000/teams', json.dumps(team)).content)
-        
-    for r in results:
-        print(requests.post('http://127.0.0.1:8000/games', json.dumps(r)).content)
-    
-    for s in schedule:
-        print(requests.post('http://127.0.0.1:8000/games', json.dumps(s)).content)
+        print("No changes since the last run.")
+        sent = True
+
+    # Only remember the new pages and games once everything was delivered,
+    # otherwise the next run would skip what failed as unchanged. Records
+    # the API rejected don't hold this up, they would never get through.
+    state["teams"] = sent_teams
+    if sent:
+        state["pages"] = {**state.get("pages", {}), **page_state}
+        state["games"] = diff.store
+    state["last_run"] = datetime.now().isoformat()
+    with open(STATE_FILE, "w") as f:
+        json.dump(state, f, indent=4)
 
 
 
@@ -4,7 +4,8 @@ import pytest_asyncio
 import subprocess
 import os
 from prisma import Prisma
-from backend.main import app
+from backend.main import app, ingest_queue, idempotency_store, refresh_scheduler, read_cache, team_cache, standings_changed
+from backend.db import InstrumentedPrisma, assert_max_queries
 from unittest.mock import patch
 from fastapi.testclient import TestClient
 from httpx import AsyncClient, ASGITransport 
@@ -55,22 +56,42 @@ def setup_test_database():
 @pytest_asyncio.fixture
 async def db_integration():
     print("\n--- 2. Connecting to DB ---")
-    client = Prisma(datasource={'url': TEST_DB_URL})
+    # Instrumented so tests can put query budgets on endpoints
+    client = InstrumentedPrisma(datasource={'url': TEST_DB_URL})
     await client.connect()
     
     # CLEANUP: Wipe the DB clean before giving it to the test
     # Order matters: delete children (Game) before parents (Team)
     await client.game.delete_many()
     await client.team.delete_many()
+    read_cache.invalidate()
+    team_cache.clear()
+    idempotency_store.clear()
+    standings_changed()
 
     # Patch the global 'db' in main.py with this new client
     with patch("backend.main.db", client):
         yield client
+        # Don't leave queued ingests or a deferred standings refresh running
+        # against a closed client
+        await ingest_queue.close()
+        await refresh_scheduler.close()
 
     # Teardown
     print("\n--- 3. Disconnecting ---")
     await client.disconnect()
 
+@pytest.fixture
+def max_queries():
+    """
+    Returns a context manager failing the test if the block issues more
+    than the given number of queries:
+
+        with max_queries(3):
+            await client_integration.get("/games")
+    """
+    return assert_max_queries
+
 @pytest_asyncio.fixture
 async def client_integration():
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
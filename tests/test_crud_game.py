@@ -1,5 +1,11 @@
+import asyncio
+import csv
+import json
 import pytest
-from datetime import datetime
+from unittest.mock import patch
+from datetime import datetime, timedelta, timezone
+from backend.ingest import QueueFull
+from backend.main import ingest_queue
 
 
 @pytest.mark.asyncio
@@ -145,3 +151,292 @@ async def test_query_games(client_integration, db_integration, sample_games_data
     assert (await client_integration.get(f"/games?date={datetime.now().isoformat()}")).status_code == 200
     assert all(game["gameTime"] > datetime.now().isoformat() for game in (await client_integration.get(f"/games?date={datetime.now().isoformat()}")).json())
 
+
+@pytest.mark.asyncio
+async def test_query_games_time_range(client_integration, db_integration, sample_games_data):
+    await client_integration.post("/games/bulk", json=[game.model_dump(mode="json") for game in sample_games_data])
+    now = datetime.now(timezone.utc)
+
+    past = (await client_integration.get("/games", params={"to": now.isoformat(), "limit": 100})).json()
+    future = (await client_integration.get("/games", params={"from": now.isoformat(), "limit": 100})).json()
+    assert len(past) == 3
+    assert len(future) == 3
+
+    # A window around the future games, in another timezone
+    window = {
+        "from": (now + timedelta(days=4)).astimezone(timezone(timedelta(hours=-5))).isoformat(),
+        "to": (now + timedelta(days=6)).isoformat(),
+    }
+    response = await client_integration.get("/games", params=window)
+    assert [game["location"] for game in response.json()] == [game["location"] for game in future]
+
+    # Naive times are UTC
+    response = await client_integration.get("/games", params={"to": now.replace(tzinfo=None).isoformat(), "limit": 100})
+    assert len(response.json()) == 3
+
+    response = await client_integration.get("/games", params={"from": now.isoformat(), "to": (now - timedelta(days=1)).isoformat()})
+    assert response.status_code == 400
+
+    for param in ("date", "from", "to"):
+        response = await client_integration.get("/games", params={param: "not a date"})
+        assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_query_games_status_and_div(client_integration, db_integration, sample_games_data):
+    games = [game.model_dump(mode="json") for game in sample_games_data]
+    games[0].update(homeScore=None, awayScore=None)
+    await client_integration.post("/games/bulk", json=games)
+
+    response = await client_integration.get("/games", params={"status": "SCHEDULED"})
+    assert [game["location"] for game in response.json()] == ["Stadium - Field 1"]
+
+    # Leave Team A alone in its division
+    await db_integration.team.update_many(where={"name": {"not": "Team A"}}, data={"div": 0})
+    team_a = await db_integration.team.find_first(where={"name": "Team A"})
+    assert team_a.div == 1
+    response = await client_integration.get("/games", params={"div": team_a.div, "limit": 100})
+    names = {(game["homeTeam"]["name"], game["awayTeam"]["name"]) for game in response.json()}
+    assert names == {("Team A", "Team B"), ("Team C", "Team A")}
+
+    response = await client_integration.get("/games", params={"div": team_a.div, "team_id": team_a.id, "status": "FINISHED", "sort_by": "gameTime"})
+    assert [(game["homeTeam"]["name"], game["awayTeam"]["name"]) for game in response.json()] == [("Team C", "Team A")]
+
+@pytest.mark.asyncio
+async def test_create_games_bulk(client_integration, db_integration, sample_games_data):
+    payload = [game.model_dump(mode="json") for game in sample_games_data]
+
+    response = await client_integration.post("/games/bulk", json=payload)
+    assert response.status_code == 200
+    assert response.json() == {"created": len(sample_games_data), "skipped": 0}
+    assert await db_integration.game.count() == len(sample_games_data)
+    assert await db_integration.team.count() == 6
+
+    # Posting the same batch again should not create anything
+    response = await client_integration.post("/games/bulk", json=payload)
+    assert response.status_code == 200
+    assert response.json() == {"created": 0, "skipped": len(sample_games_data)}
+    assert await db_integration.game.count() == len(sample_games_data)
+
+    # Stats are applied once per affected team
+    team_a = await db_integration.team.find_first(where={"name": "Team A"})
+    team_c = await db_integration.team.find_first(where={"name": "Team C"})
+    assert team_a.w == 1
+    assert team_a.points == 3
+    assert team_c.gamesPlayed == 2
+    assert team_c.gd == 4
+
+@pytest.mark.asyncio
+async def test_upsert_games_bulk(client_integration, db_integration, sample_games_data):
+    payload = [game.model_dump(mode="json") for game in sample_games_data]
+    await client_integration.post("/games/bulk", json=payload[1:])
+
+    # A new game, a corrected score and an untouched game
+    payload[1]["home_score"], payload[1]["away_score"] = 0, 1
+    response = await client_integration.put("/games/bulk", json=payload[:3])
+    assert response.status_code == 200
+    assert response.json() == {"created": 1, "updated": 1, "unchanged": 1}
+    assert await db_integration.game.count() == len(sample_games_data)
+
+    # The old result is taken out of the stats and the new one applied
+    team_c = await db_integration.team.find_first(where={"name": "Team C"})
+    team_d = await db_integration.team.find_first(where={"name": "Team D"})
+    assert (team_c.w, team_c.l, team_c.gamesPlayed) == (1, 1, 2)
+    assert (team_d.w, team_d.l, team_d.gd) == (1, 1, 0)
+
+    response = await client_integration.put("/games/bulk", json=payload[:3])
+    assert response.json() == {"created": 0, "updated": 0, "unchanged": 3}
+
+    # A fixture listing of a finished game doesn't take its result away
+    fixture = {**payload[0], "home_score": None, "away_score": None}
+    response = await client_integration.put("/games/bulk", json=[fixture])
+    assert response.json() == {"created": 0, "updated": 0, "unchanged": 1}
+    team_a = await db_integration.team.find_first(where={"name": "Team A"})
+    assert team_a.w == 1
+
+@pytest.mark.asyncio
+async def test_overlapping_upserts_apply_stats_once(client_integration, db_integration, sample_games_data):
+    payload = [sample_games_data[0].model_dump(mode="json")]
+    await client_integration.post("/games/bulk", json=payload)
+
+    # Two overlapping scraper runs sending the same corrected score
+    payload[0]["home_score"], payload[0]["away_score"] = 0, 3
+    responses = await asyncio.gather(*[client_integration.put("/games/bulk", json=payload) for _ in range(3)])
+    assert sum(response.json()["updated"] for response in responses) == 1
+
+    team_a = await db_integration.team.find_first(where={"name": "Team A"})
+    team_b = await db_integration.team.find_first(where={"name": "Team B"})
+    assert (team_a.w, team_a.l, team_a.gamesPlayed, team_a.gd) == (0, 1, 1, -3)
+    assert (team_b.w, team_b.points) == (1, 3)
+
+@pytest.mark.asyncio
+async def test_delete_games_bulk(client_integration, db_integration, sample_games_data):
+    payload = [game.model_dump(mode="json") for game in sample_games_data]
+    await client_integration.post("/games/bulk", json=payload)
+
+    keys = [{key: payload[0][key] for key in ("field_name", "field_num", "game_time")}]
+    keys.append({"field_name": "Nowhere", "field_num": 9, "game_time": payload[0]["game_time"]})
+    response = await client_integration.post("/games/bulk/delete", json=keys)
+    assert response.status_code == 200
+    assert response.json() == {"deleted": 1}
+    assert await db_integration.game.count() == len(sample_games_data) - 1
+
+    team_a = await db_integration.team.find_first(where={"name": "Team A"})
+    assert (team_a.w, team_a.l, team_a.gamesPlayed) == (0, 1, 1)
+    assert team_a.points == 0
+
+@pytest.mark.asyncio
+async def test_create_game_deduplicates(client_integration, db_integration, sample_games_data):
+    payload = sample_games_data[0].model_dump(mode="json")
+
+    # Overlapping ingests of the same game must not create duplicates
+    responses = await asyncio.gather(*[client_integration.post("/games", json=payload) for _ in range(5)])
+    assert all(response.status_code == 200 for response in responses)
+    assert await db_integration.game.count() == 1
+    assert sum("message" not in response.json() for response in responses) == 1
+
+    response = await client_integration.post("/games", json=payload)
+    assert response.json()["message"] == "Game already exists"
+
+    # Stats were applied exactly once
+    team_a = await db_integration.team.find_first(where={"name": "Team A"})
+    assert team_a.gamesPlayed == 1
+
+@pytest.mark.asyncio
+async def test_create_game_without_offset(client_integration, db_integration, sample_games_data):
+    payload = sample_games_data[0].model_dump(mode="json")
+    payload["game_time"] = "2025-01-01T12:00:00"
+
+    response = await client_integration.post("/games", json=payload)
+    assert response.status_code == 200
+    game = await db_integration.game.find_first()
+    assert game.gameTime.isoformat() == "2025-01-01T12:00:00+00:00"
+
+    # Same key as the bulk endpoint uses
+    response = await client_integration.post("/games/bulk", json=[payload])
+    assert response.json() == {"created": 0, "skipped": 1}
+
+@pytest.mark.asyncio
+async def test_create_game_async(client_integration, db_integration, sample_games_data):
+    payload = sample_games_data[0].model_dump(mode="json")
+
+    responses = [await client_integration.post("/games?async=true", json=payload) for _ in range(2)]
+    assert all(response.status_code == 202 for response in responses)
+    job_ids = [response.json()["job_id"] for response in responses]
+    assert responses[0].headers["location"] == f"/jobs/{job_ids[0]}"
+
+    await ingest_queue.join()
+
+    jobs = [(await client_integration.get(f"/jobs/{job_id}")).json() for job_id in job_ids]
+    assert [job["status"] for job in jobs] == ["done", "done"]
+    assert sorted(job["result"] for job in jobs) == ["created", "exists"]
+    assert await db_integration.game.count() == 1
+
+    team_a = await db_integration.team.find_first(where={"name": "Team A"})
+    assert team_a.gamesPlayed == 1
+
+    response = await client_integration.get("/jobs/unknown")
+    assert response.status_code == 404
+
+@pytest.mark.asyncio
+async def test_create_game_async_rejects_bad_time(client_integration, db_integration, sample_games_data):
+    payload = {**sample_games_data[0].model_dump(mode="json"), "game_time": "next tuesday"}
+
+    # Rejected up front instead of failing in the worker
+    with patch.object(ingest_queue, "submit") as submit:
+        response = await client_integration.post("/games?async=true", json=payload)
+    assert response.status_code == 422
+    submit.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_create_game_async_backpressure(client_integration, db_integration, sample_games_data):
+    payload = sample_games_data[0].model_dump(mode="json")
+
+    with patch.object(ingest_queue, "submit", side_effect=QueueFull("Ingest queue is full (1000 jobs)")):
+        response = await client_integration.post("/games?async=true", json=payload)
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert await db_integration.game.count() == 0
+
+@pytest.mark.asyncio
+async def test_query_games_cursor_pagination(client_integration, db_integration, sample_games_data):
+    response = await client_integration.post("/games/bulk", json=[game.model_dump(mode="json") for game in sample_games_data])
+    assert response.status_code == 200
+
+    team_c = await db_integration.team.find_first(where={"name": "Team C"})
+
+    for query, expected_count in [("", len(sample_games_data)), (f"&team_id={team_c.id}", 2)]:
+        for sort_by in ["gameTime", "-gameTime"]:
+            # Several games share a gameTime, so pages must break ties on id
+            pages = []
+            response = await client_integration.get(f"/games?sort_by={sort_by}&limit=2{query}")
+            pages.append(response.json())
+            while "x-next-cursor" in response.headers:
+                response = await client_integration.get(f"/games?limit=2&cursor={response.headers['x-next-cursor']}{query}")
+                assert response.status_code == 200
+                pages.append(response.json())
+
+            games = [game for page in pages for game in page]
+            full = (await client_integration.get(f"/games?sort_by={sort_by}&limit=100{query}")).json()
+            assert len(games) == expected_count
+            assert [game["id"] for game in games] == [game["id"] for game in full]
+            assert len({game["id"] for game in games}) == expected_count
+
+    assert (await client_integration.get("/games?cursor=not-a-cursor")).status_code == 400
+
+@pytest.mark.asyncio
+async def test_export_games(client_integration, db_integration, sample_games_data):
+    await client_integration.post("/games/bulk", json=[game.model_dump(mode="json") for game in sample_games_data])
+
+    with patch("backend.main.EXPORT_CHUNK_SIZE", 4):
+        response = await client_integration.get("/export/games")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["id"] for row in rows] == sorted(game.id for game in await db_integration.game.find_many())
+
+        response = await client_integration.get("/export/games?format=csv")
+        lines = list(csv.reader(response.text.splitlines()))
+        assert lines[0][:2] == ["id", "gameTime"]
+        assert len(lines) == len(sample_games_data) + 1
+
+    team_a = await db_integration.team.find_first(where={"name": "Team A"})
+    response = await client_integration.get(f"/export/games?team_id={team_a.id}&to={datetime.now().isoformat()}")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 1
+    assert team_a.id in (rows[0]["homeTeamId"], rows[0]["awayTeamId"])
+
+    # Naive times are UTC, as for GET /games
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    listed = (await client_integration.get("/games", params={"to": now.isoformat(), "limit": 100})).json()
+    response = await client_integration.get("/export/games", params={"to": now.isoformat()})
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == sorted(game["id"] for game in listed)
+    assert (await client_integration.get("/export/games", params={"from": "not a date"})).status_code == 400
+
+    response = await client_integration.get("/export/teams?format=csv")
+    assert len(response.text.splitlines()) == 7
+
+    assert (await client_integration.get("/export/games?format=xml")).status_code == 400
+
+@pytest.mark.asyncio
+async def test_query_games_fields(client_integration, db_integration, sample_games_data):
+    await client_integration.post("/games/bulk", json=[game.model_dump(mode="json") for game in sample_games_data])
+
+    # Embedded teams are slim by default
+    game = (await client_integration.get("/games?limit=1")).json()[0]
+    assert set(game) == {"id", "gameTime", "location", "status", "homeTeamId", "homeScore", "awayTeamId", "awayScore", "info", "homeTeam", "awayTeam"}
+    assert set(game["homeTeam"]) == {"id", "name"}
+    assert game["gameTime"].endswith("Z")
+
+    response = await client_integration.get("/games?limit=1&fields=id,homeScore,homeTeam,awayTeam.primaryColor")
+    assert response.status_code == 200
+    game = response.json()[0]
+    assert set(game) == {"id", "homeScore", "homeTeam", "awayTeam"}
+    assert set(game["homeTeam"]) == {"id", "name"}
+    assert set(game["awayTeam"]) == {"primaryColor"}
+
+    game = (await client_integration.get("/games?limit=1&fields=id")).json()[0]
+    assert game == {"id": game["id"]}
+
+    assert (await client_integration.get("/games?fields=password")).status_code == 400
+    assert (await client_integration.get("/games?fields=homeTeam.password")).status_code == 400
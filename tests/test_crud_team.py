@@ -1,4 +1,5 @@
 import pytest
+from backend.main import refresh_scheduler
 
 @pytest.mark.asyncio
 async def test_crud_team(db_integration, client_integration):
@@ -52,4 +53,50 @@ async def test_crud_team(db_integration, client_integration):
     response = await client_integration.delete(f"/teams/{response.json()['id']}")
     assert response.status_code == 200
     assert response.json()["name"] == "Updated Team"
-    assert await db_integration.team.find_unique(where={"id": response.json()["id"]}) is None
\ No newline at end of file
+    assert await db_integration.team.find_unique(where={"id": response.json()["id"]}) is None
+
+@pytest.mark.asyncio
+async def test_team_etags(db_integration, client_integration):
+    new_team = {
+        "name": "New Team",
+        "primary_color": "Red",
+        "secondary_color": "Black",
+        "div": 1
+    }
+    await client_integration.post("/teams", json=new_team)
+
+    response = await client_integration.get("/teams")
+    etag = response.headers["etag"]
+    assert response.status_code == 200
+
+    response = await client_integration.get("/teams", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    # Different queries get different tags
+    response = await client_integration.get("/teams?name=New Team", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+    # Any write changes the tag
+    await client_integration.post("/teams", json={**new_team, "name": "Other Team"})
+    response = await client_integration.get("/teams", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+@pytest.mark.asyncio
+async def test_moving_division_reranks_both(db_integration, client_integration, sample_games_data):
+    await client_integration.post("/games/bulk", json=[game.model_dump(mode="json") for game in sample_games_data])
+    await refresh_scheduler.flush()
+
+    team_a = await db_integration.team.find_first(where={"name": "Team A"})
+    moved = {"name": "Team A", "primary_color": team_a.primaryColor, "secondary_color": team_a.secondaryColor, "div": 1 - team_a.div}
+    response = await client_integration.post("/teams", json=moved)
+    assert response.status_code == 200
+    await refresh_scheduler.flush()
+
+    # No duplicate ranks in the new division and no gap in the old one
+    for div in (0, 1):
+        teams = await db_integration.team.find_many(where={"div": div})
+        assert sorted(team.rank for team in teams) == list(range(1, len(teams) + 1))
@@ -1,5 +1,6 @@
 import pytest
 from prisma.errors import PrismaError
+from backend.main import refresh_scheduler
 
 
 @pytest.mark.asyncio
@@ -81,4 +82,72 @@ async def test_calculate_stats_integration(client_integration, db_integration):
     
     assert updated_team_a.w == 1       # Wins
     assert updated_team_a.points == 3  # Points
-    assert updated_team_a.gd == 5      # Goal Diff
\ No newline at end of file
+    assert updated_team_a.gd == 5      # Goal Diff
+
+@pytest.mark.asyncio
+async def test_refresh_rank_orders_division(client_integration, db_integration):
+    """
+    Ranks follow points, then goal difference, then goals for, and are
+    unique within a division.
+    """
+    teams = []
+    for name, points, gd, gf in [("A", 3, 1, 2), ("B", 6, 0, 1), ("C", 3, 1, 5), ("D", 3, 1, 5)]:
+        teams.append(await db_integration.team.create(data={
+            "name": name, "div": 1, "primaryColor": "x", "secondaryColor": "y",
+            "points": points, "gd": gd, "gf": gf
+        }))
+    other_div = await db_integration.team.create(data={"name": "E", "div": 2, "primaryColor": "x", "secondaryColor": "y"})
+
+    response = await client_integration.post(f"/refresh_rank?team_id={teams[0].id}")
+    assert response.status_code == 200
+    assert [team["name"] for team in response.json()] == ["B", "C", "D", "A"]
+
+    ranks = {team.name: team.rank for team in await db_integration.team.find_many()}
+    assert ranks == {"B": 1, "C": 2, "D": 3, "A": 4, "E": 0}
+    assert other_div.rank == 0
+
+
+@pytest.mark.asyncio
+async def test_standings(client_integration, db_integration, sample_games_data):
+    response = await client_integration.post("/games/bulk", json=[game.model_dump(mode="json") for game in sample_games_data])
+    assert response.status_code == 200
+
+    # Ranks are refreshed in the background
+    await refresh_scheduler.flush()
+
+    response = await client_integration.get("/standings?div=1")
+    assert response.status_code == 200
+    table = response.json()
+    assert [team["rank"] for team in table] == list(range(1, len(table) + 1))
+    assert all(team["div"] == 1 for team in table)
+    assert [team["points"] for team in table] == sorted((team["points"] for team in table), reverse=True)
+
+    response = await client_integration.get("/standings")
+    assert {division["div"] for division in response.json()} == {0, 1}
+
+    etag = response.headers["etag"]
+    assert (await client_integration.get("/standings", headers={"If-None-Match": etag})).status_code == 304
+
+    # A rank refresh replaces the snapshot
+    await client_integration.post(f"/refresh_rank?team_id={table[0]['id']}")
+    assert (await client_integration.get("/standings", headers={"If-None-Match": etag})).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_rebuild_stats_repairs_drift(client_integration, db_integration, sample_games_data):
+    await client_integration.post("/games/bulk", json=[game.model_dump(mode="json") for game in sample_games_data])
+    expected = {team.name: team for team in await db_integration.team.find_many()}
+
+    # Corrupt the stored stats
+    await db_integration.team.update_many(where={}, data={"points": 99, "gf": 0, "gamesPlayed": 0})
+
+    response = await client_integration.post("/admin/rebuild_stats")
+    assert response.status_code == 200
+    assert response.json()["games"] == len(sample_games_data)
+
+    for team in await db_integration.team.find_many():
+        assert (team.points, team.gf, team.ga, team.gd, team.w, team.l, team.d, team.gamesPlayed) == (
+            expected[team.name].points, expected[team.name].gf, expected[team.name].ga, expected[team.name].gd,
+            expected[team.name].w, expected[team.name].l, expected[team.name].d, expected[team.name].gamesPlayed
+        )
+        assert team.rank > 0
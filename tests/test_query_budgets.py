@@ -0,0 +1,98 @@
+import pytest
+from backend.main import refresh_scheduler
+
+
+@pytest.mark.asyncio
+async def test_create_game_query_budget(client_integration, db_integration, sample_games_data, max_queries):
+    payload = sample_games_data[0].model_dump(mode="json")
+
+    # Probe, two team upserts, insert, read back and one stats update per team
+    with max_queries(7):
+        response = await client_integration.post("/games", json=payload)
+    assert response.status_code == 200
+
+    # A replay is a single index probe
+    with max_queries(1):
+        response = await client_integration.post("/games", json=payload)
+    assert response.json()["message"] == "Game already exists"
+
+    # The deferred rank refresh is one statement
+    with max_queries(1):
+        await refresh_scheduler.flush()
+
+@pytest.mark.asyncio
+async def test_idempotent_replay_skips_the_database(client_integration, db_integration, sample_games_data, max_queries):
+    payload = sample_games_data[0].model_dump(mode="json")
+    headers = {"Idempotency-Key": "game-1"}
+
+    first = await client_integration.post("/games", json=payload, headers=headers)
+
+    with max_queries(0):
+        replay = await client_integration.post("/games", json=payload, headers=headers)
+    assert replay.json() == first.json()
+    assert replay.headers["idempotent-replayed"] == "true"
+
+    # Same key, different game
+    other = sample_games_data[1].model_dump(mode="json")
+    response = await client_integration.post("/games", json=other, headers=headers)
+    assert response.status_code == 422
+
+    # Short-circuited responses are still labelled with their route
+    metrics = (await client_integration.get("/metrics")).text
+    assert 'http_request_duration_seconds_count{method="POST",route="/games",status="200"}' in metrics
+    assert 'http_request_duration_seconds_count{method="POST",route="unmatched"' not in metrics
+
+@pytest.mark.asyncio
+async def test_known_teams_are_not_written(client_integration, db_integration, sample_games_data, max_queries):
+    await client_integration.post("/games", json=sample_games_data[0].model_dump(mode="json"))
+
+    # Same teams and colors, different slot: the only team writes are the stats
+    payload = sample_games_data[0].model_copy(update={"field_num": 9}).model_dump(mode="json")
+    with max_queries(5) as stats:
+        response = await client_integration.post("/games", json=payload)
+    assert response.status_code == 200
+    assert ("Team", "upsert") not in stats.queries
+
+    # A color change is a single update
+    payload = sample_games_data[0].model_copy(update={"field_num": 10, "home_team_primary_color": "#123456"}).model_dump(mode="json")
+    with max_queries(6):
+        await client_integration.post("/games", json=payload)
+    home_team = await db_integration.team.find_unique(where={"name": "Team A"})
+    assert home_team.primaryColor == "#123456"
+
+@pytest.mark.asyncio
+async def test_bulk_ingest_query_budget(client_integration, db_integration, sample_games_data, max_queries):
+    payload = [game.model_dump(mode="json") for game in sample_games_data]
+
+    # Team lookup, create and re-read, the game insert, then one stats
+    # update per team. Nothing scales with the number of games.
+    with max_queries(4 + 6):
+        response = await client_integration.post("/games/bulk", json=payload)
+    assert response.json()["created"] == len(sample_games_data)
+
+    # Teams come from the team cache, so only the game insert is left
+    with max_queries(1):
+        response = await client_integration.post("/games/bulk", json=payload)
+    assert response.json()["skipped"] == len(sample_games_data)
+
+    # A replay that changes nothing keeps the read cache and the rankings
+    await refresh_scheduler.flush()
+    await client_integration.get("/games")
+    await client_integration.put("/games/bulk", json=payload)
+    assert not refresh_scheduler.pending
+    with max_queries(0):
+        await client_integration.get("/games")
+
+@pytest.mark.asyncio
+async def test_read_query_budget(client_integration, db_integration, sample_games_data, max_queries):
+    await client_integration.post("/games/bulk", json=[game.model_dump(mode="json") for game in sample_games_data])
+    team = await db_integration.team.find_first(where={"name": "Team A"})
+
+    with max_queries(2):
+        response = await client_integration.get(f"/games?team_id={team.id}&sort_by=gameTime")
+    assert response.status_code == 200
+
+    # Served from the read cache
+    with max_queries(0):
+        await client_integration.get(f"/games?team_id={team.id}&sort_by=gameTime")
+        await client_integration.get(f"/games?team_id={team.id}&sort_by=gameTime")
@@ -0,0 +1,86 @@
+import pytest
+from datetime import datetime
+from backend.main import team_games_query
+
+
+SEED_TEAMS = 120
+SEED_GAMES = 100_000
+
+
+async def seed_games(db):
+    await db.execute_raw(f"""
+        INSERT INTO "Team" ("name", "primaryColor", "secondaryColor", "div")
+        SELECT 'Team ' || i, 'x', 'y', i % 10
+        FROM generate_series(1, {SEED_TEAMS}) AS i
+    """)
+    await db.execute_raw(f"""
+        INSERT INTO "Game" ("gameTime", "location", "status", "homeTeamId", "awayTeamId", "homeScore", "awayScore")
+        SELECT
+            timestamp '2015-01-01' + i * interval '1 hour',
+            'Field ' || i,
+            'FINISHED'::"GameStatus",
+            t.first_id + (i % {SEED_TEAMS}),
+            t.first_id + ((i * 7 + 1) % {SEED_TEAMS}),
+            i % 5,
+            i % 3
+        FROM generate_series(1, {SEED_GAMES}) AS i, (SELECT min("id") AS first_id FROM "Team") AS t
+    """)
+    await db.execute_raw('ANALYZE "Game"')
+
+
+async def explain(db, query, *params):
+    rows = await db.query_raw("EXPLAIN " + query, *params)
+    return "\n".join(row["QUERY PLAN"] for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_team_games_query_uses_indexes(db_integration):
+    await seed_games(db_integration)
+    team = await db_integration.team.find_first(where={"name": "Team 7"})
+
+    for time_range, direction in [
+        (None, "asc"),
+        ({"gt": datetime(2020, 1, 1)}, "asc"),
+        ({"lt": datetime(2020, 1, 1)}, "desc"),
+        ({"gte": datetime(2020, 1, 1), "lt": datetime(2020, 1, 8)}, "asc"),
+    ]:
+        plan = await explain(db_integration, *team_games_query(
+            team.id,
+            time_range=time_range,
+            direction=direction,
+            limit=10
+        ))
+
+        assert "Seq Scan" not in plan, plan
+        assert "Game_homeTeamId_gameTime_idx" in plan
+        assert "Game_awayTeamId_gameTime_idx" in plan
+
+
+@pytest.mark.asyncio
+async def test_team_games_query_matches_or_filter(db_integration):
+    await seed_games(db_integration)
+    team = await db_integration.team.find_first(where={"name": "Team 7"})
+    bound_time = datetime(2020, 1, 1)
+
+    rows = await db_integration.query_raw(*team_games_query(team.id, time_range={"lt": bound_time}, direction="desc", limit=25))
+    expected = await db_integration.game.find_many(
+        where={"OR": [{"homeTeamId": team.id}, {"awayTeamId": team.id}], "gameTime": {"lt": bound_time}},
+        order=[{"gameTime": "desc"}, {"id": "desc"}],
+        take=25
+    )
+
+    assert [row["id"] for row in rows] == [game.id for game in expected]
+
+
+@pytest.mark.asyncio
+async def test_status_range_filter_uses_index(db_integration):
+    await seed_games(db_integration)
+
+    plan = await explain(
+        db_integration,
+        'SELECT "id" FROM "Game" WHERE "status" = $1::"GameStatus" AND "gameTime" >= $2::timestamp AND "gameTime" < $3::timestamp ORDER BY "gameTime" LIMIT 50',
+        "FINISHED", "2020-01-04T00:00:00", "2020-01-06T00:00:00"
+    )
+
+    assert "Seq Scan" not in plan, plan
+    assert "Game_status_gameTime_idx" in plan
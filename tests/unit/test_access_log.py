@@ -0,0 +1,52 @@
+import io
+import json
+import time
+from backend.access_log import AccessLogger, redact_headers
+
+
+def test_writes_one_json_line_per_request():
+    stream = io.StringIO()
+    logger = AccessLogger(name="test.access.lines")
+    logger.start(stream)
+
+    logger.log("GET", "/games/4", "/games/{game_id}", 200, time.perf_counter())
+    logger.log("POST", "/games", "/games", 422, time.perf_counter())
+    logger.stop()
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(entry["method"], entry["route"], entry["status"]) for entry in entries] == [
+        ("GET", "/games/{game_id}", 200),
+        ("POST", "/games", 422),
+    ]
+    assert entries[0]["path"] == "/games/4"
+    assert entries[0]["duration_ms"] >= 0
+    assert "headers" not in entries[0]
+
+def test_sampling_keeps_errors():
+    stream = io.StringIO()
+    logger = AccessLogger(name="test.access.sampling")
+    logger.sample_rate = 0.0
+    logger.start(stream)
+
+    logger.log("GET", "/teams", "/teams", 200, time.perf_counter())
+    logger.log("GET", "/teams", "/teams", 500, time.perf_counter())
+    logger.stop()
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [entry["status"] for entry in entries] == [500]
+
+def test_not_started_logs_nothing():
+    logger = AccessLogger(name="test.access.stopped")
+
+    logger.log("GET", "/teams", "/teams", 200, time.perf_counter())
+
+    assert logger._queue.empty()
+
+def test_redact_headers():
+    headers = {"Authorization": "Bearer secret", "Cookie": "a=b", "Accept": "application/json"}
+
+    assert redact_headers(headers) == {
+        "Authorization": "[REDACTED]",
+        "Cookie": "[REDACTED]",
+        "Accept": "application/json",
+    }
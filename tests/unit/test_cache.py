@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+from backend.cache import ReadCache, TeamCache, CachedTeam, MISSING
+
+
+def test_get_and_set():
+    cache = ReadCache()
+
+    assert cache.get("a") is MISSING
+    cache.set("a", None, cache.version)
+    assert cache.get("a") is None
+
+def test_lru_eviction():
+    cache = ReadCache(max_entries=2)
+
+    cache.set("a", 1, cache.version)
+    cache.set("b", 2, cache.version)
+    cache.get("a")
+    cache.set("c", 3, cache.version)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is MISSING
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+def test_invalidate_drops_everything():
+    cache = ReadCache()
+    cache.set("a", 1, cache.version)
+
+    cache.invalidate()
+
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+def test_value_loaded_before_write_is_not_stored():
+    cache = ReadCache()
+    version = cache.version
+
+    # A write lands while the value is being loaded
+    cache.invalidate()
+    cache.set("a", "stale", version)
+
+    assert cache.get("a") is MISSING
+
+def make_team(id, name, primary_color="#000000", div=0):
+    return SimpleNamespace(id=id, name=name, primaryColor=primary_color, secondaryColor="#FFFFFF", div=div)
+
+def test_team_cache_put_and_get():
+    teams = TeamCache()
+    teams.load([make_team(1, "Team A"), make_team(2, "Team B", div=1)])
+
+    assert teams.get("Team B") == CachedTeam(2, "#000000", "#FFFFFF", 1)
+    assert teams.get("Team C") is None
+    assert len(teams) == 2
+
+def test_team_cache_rename_drops_old_name():
+    teams = TeamCache()
+    teams.put(make_team(1, "Team A"))
+
+    teams.put(make_team(1, "Team Z", primary_color="#FF0000"))
+
+    assert teams.get("Team A") is None
+    assert teams.get("Team Z").primary_color == "#FF0000"
+
+def test_team_cache_recreated_name_replaces_old_id():
+    teams = TeamCache()
+    teams.put(make_team(1, "Team A"))
+    teams.put(make_team(5, "Team A"))
+
+    # Forgetting the old id must not drop the new entry
+    teams.forget(1)
+
+    assert teams.get("Team A").id == 5
+
+def test_team_cache_forget_and_clear():
+    teams = TeamCache()
+    teams.load([make_team(1, "Team A"), make_team(2, "Team B")])
+
+    teams.forget(1)
+    assert teams.get("Team A") is None
+
+    teams.clear()
+    assert len(teams) == 0
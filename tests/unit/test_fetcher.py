@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import aiohttp
+import pytest
+from aiohttp import web
+
+# The scraper runs as a script from its own directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "scraper"))
+
+from fetcher import Fetcher, HostLimiter, parse_retry_after
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+@pytest.mark.asyncio
+async def test_requests_to_one_host_are_spaced():
+    limiter = HostLimiter(delay=0.05)
+    loop = asyncio.get_running_loop()
+    starts = []
+
+    async def request(host):
+        await limiter.wait(host)
+        starts.append((host, loop.time()))
+
+    await asyncio.gather(request("a"), request("a"), request("b"))
+
+    times_a = [time for host, time in starts if host == "a"]
+    time_b = next(time for host, time in starts if host == "b")
+    assert times_a[1] - times_a[0] >= 0.05
+    # Other hosts don't wait
+    assert time_b - times_a[0] < 0.05
+
+@pytest.mark.asyncio
+async def test_retries_server_errors():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.match_info["name"])
+        if len(calls) < 3:
+            return web.Response(status=503)
+        return web.Response(text="<html></html>")
+
+    runner, base_url = await serve(handler)
+    try:
+        async with aiohttp.ClientSession() as session:
+            fetcher = Fetcher(session, delay=0, retries=3, backoff=0.01)
+            page = await fetcher.fetch(f"{base_url}/page")
+            assert page.text == "<html></html>"
+    finally:
+        await runner.cleanup()
+
+    assert len(calls) == 3
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.match_info["name"])
+        return web.Response(status=404)
+
+    runner, base_url = await serve(handler)
+    try:
+        async with aiohttp.ClientSession() as session:
+            fetcher = Fetcher(session, delay=0, retries=3, backoff=0.01)
+            assert await fetcher.fetch(f"{base_url}/missing") is None
+    finally:
+        await runner.cleanup()
+
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_conditional_request_not_modified():
+    async def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text="<html></html>", headers={"ETag": '"v1"', "Last-Modified": "Sat, 17 Oct 2026 10:00:00 GMT"})
+
+    runner, base_url = await serve(handler)
+    try:
+        async with aiohttp.ClientSession() as session:
+            fetcher = Fetcher(session, delay=0)
+            first = await fetcher.fetch(f"{base_url}/page")
+            assert first.status == 200
+            assert first.etag == '"v1"'
+            assert first.last_modified == "Sat, 17 Oct 2026 10:00:00 GMT"
+
+            second = await fetcher.fetch(f"{base_url}/page", first.etag, first.last_modified)
+    finally:
+        await runner.cleanup()
+
+    assert second.not_modified
+    assert second.text is None
+    assert second.etag == first.etag
+
+def test_parse_retry_after():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
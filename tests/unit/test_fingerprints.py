@@ -0,0 +1,84 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+# The scraper runs as a script from its own directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "scraper"))
+
+from fingerprints import diff_games, game_key
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+RESULTS = "https://example.com/results"
+SCHEDULE = "https://example.com/schedule"
+
+
+def make_game(home_team, away_team, game_time, field_num=1, home_score=None, away_score=None):
+    return {
+        "home_team": home_team,
+        "home_team_primary_color": "Red",
+        "home_team_secondary_color": "Black",
+        "home_score": home_score,
+        "away_team": away_team,
+        "away_team_primary_color": "Blue",
+        "away_team_secondary_color": "White",
+        "away_score": away_score,
+        "field_name": "Park",
+        "field_num": field_num,
+        "game_time": game_time,
+        "info": None
+    }
+
+PAST = "2026-05-20T19:00:00-04:00"
+FUTURE = "2026-06-10T19:00:00-04:00"
+
+
+def test_first_run_sends_everything():
+    games = [make_game("A", "B", PAST, home_score=1, away_score=0), make_game("C", "D", FUTURE)]
+    diff = diff_games({}, {RESULTS: games[:1], SCHEDULE: games[1:]}, NOW)
+
+    assert diff.upserts == games
+    assert diff.deletes == []
+    assert diff.store[game_key(games[0])]["source"] == RESULTS
+
+def test_only_changed_games_are_sent():
+    fixture = make_game("A", "B", PAST)
+    other = make_game("C", "D", FUTURE)
+    store = diff_games({}, {SCHEDULE: [fixture, other]}, NOW).store
+
+    # The fixture's result is posted and moves to the results page
+    result = make_game("A", "B", PAST, home_score=2, away_score=2)
+    diff = diff_games(store, {SCHEDULE: [other], RESULTS: [result]}, NOW)
+    assert diff.upserts == [result]
+    assert diff.deletes == []
+
+    diff = diff_games(diff.store, {SCHEDULE: [other], RESULTS: [result]}, NOW)
+    assert diff.upserts == []
+    assert diff.deletes == []
+
+def test_unparsed_pages_are_kept():
+    result = make_game("A", "B", PAST, home_score=1, away_score=0)
+    fixture = make_game("C", "D", FUTURE)
+    store = diff_games({}, {RESULTS: [result], SCHEDULE: [fixture]}, NOW).store
+
+    # Only the schedule changed, its fixture was cancelled
+    diff = diff_games(store, {SCHEDULE: []}, NOW)
+    assert diff.upserts == []
+    assert diff.deletes == [{"game_time": FUTURE, "field_name": "Park", "field_num": 1}]
+    assert list(diff.store) == [game_key(result)]
+
+def test_started_games_are_forgotten_not_deleted():
+    fixture = make_game("A", "B", PAST)
+    store = diff_games({}, {SCHEDULE: [fixture]}, NOW).store
+
+    # Gone from the schedule, but its result isn't posted yet
+    diff = diff_games(store, {SCHEDULE: []}, NOW)
+    assert diff.deletes == []
+    assert diff.store == {}
+
+def test_changed_teams_overwrite_instead_of_delete():
+    store = diff_games({}, {SCHEDULE: [make_game("A", "B", FUTURE)]}, NOW).store
+
+    replacement = make_game("A", "C", FUTURE)
+    diff = diff_games(store, {SCHEDULE: [replacement]}, NOW)
+    assert diff.upserts == [replacement]
+    assert diff.deletes == []
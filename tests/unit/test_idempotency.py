@@ -0,0 +1,101 @@
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from httpx import AsyncClient, ASGITransport
+from backend.idempotency import IdempotencyStore, FingerprintMismatch, RequestInProgress, StoredResponse, run_idempotent
+
+
+def make_app(store: IdempotencyStore):
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.middleware("http")
+    async def idempotent(request: Request, call_next):
+        if "idempotency-key" in request.headers:
+            return await run_idempotent(store, request, call_next)
+        return await call_next(request)
+
+    @app.post("/items")
+    async def create_item(item: dict):
+        app.state.calls += 1
+        if item.get("fail"):
+            raise HTTPException(status_code=503, detail="try again")
+        return {"id": app.state.calls, **item}
+
+    return app
+
+@pytest.mark.asyncio
+async def test_replay_is_served_from_the_store():
+    store = IdempotencyStore()
+    app = make_app(store)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        first = await client.post("/items", json={"name": "a"}, headers={"Idempotency-Key": "k1"})
+        replay = await client.post("/items", json={"name": "a"}, headers={"Idempotency-Key": "k1"})
+
+    assert app.state.calls == 1
+    assert replay.status_code == first.status_code == 200
+    assert replay.json() == first.json() == {"id": 1, "name": "a"}
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert replay.headers["content-type"] == "application/json"
+
+@pytest.mark.asyncio
+async def test_key_reused_for_another_request_is_rejected():
+    app = make_app(IdempotencyStore())
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await client.post("/items", json={"name": "a"}, headers={"Idempotency-Key": "k1"})
+        response = await client.post("/items", json={"name": "b"}, headers={"Idempotency-Key": "k1"})
+
+    assert response.status_code == 422
+    assert app.state.calls == 1
+
+@pytest.mark.asyncio
+async def test_key_reused_with_another_query_is_rejected():
+    app = make_app(IdempotencyStore())
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        await client.post("/items", json={"name": "a"}, headers={"Idempotency-Key": "k1"})
+        response = await client.post("/items?async=true", json={"name": "a"}, headers={"Idempotency-Key": "k1"})
+
+    assert response.status_code == 422
+    assert app.state.calls == 1
+
+@pytest.mark.asyncio
+async def test_server_errors_are_not_stored():
+    store = IdempotencyStore()
+    app = make_app(store)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        first = await client.post("/items", json={"fail": True}, headers={"Idempotency-Key": "k1"})
+        retry = await client.post("/items", json={"fail": True}, headers={"Idempotency-Key": "k1"})
+
+    assert first.status_code == retry.status_code == 503
+    assert app.state.calls == 2
+    assert len(store) == 0
+
+def test_claim_in_progress_and_release():
+    store = IdempotencyStore()
+
+    assert store.claim("k1", "fp") is None
+    with pytest.raises(RequestInProgress):
+        store.claim("k1", "fp")
+    with pytest.raises(FingerprintMismatch):
+        store.claim("k1", "other")
+
+    store.release("k1")
+    assert store.claim("k1", "fp") is None
+
+def test_entries_expire_and_are_bounded(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("backend.idempotency.time.monotonic", lambda: now[0])
+    store = IdempotencyStore(ttl=60, max_entries=2)
+
+    for key in ("k1", "k2", "k3"):
+        store.claim(key, "fp")
+        store.complete(key, StoredResponse(200, b"{}", {}))
+    assert len(store) == 2
+    assert store.claim("k1", "fp") is None
+
+    now[0] += 61
+    assert store.claim("k2", "fp") is None
+    assert len(store) == 1
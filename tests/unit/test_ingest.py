@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from backend.ingest import IngestQueue, QueueFull
+
+
+class RecordingApply:
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    async def __call__(self, items):
+        self.batches.append(items)
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        return [item * 2 for item in items]
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_applied_in_batches():
+    apply = RecordingApply()
+    queue = IngestQueue(apply, workers=1, batch_size=10)
+
+    jobs = [queue.submit(item) for item in range(5)]
+    assert all(job.status == "queued" for job in jobs)
+
+    await queue.close()
+
+    # Everything queued before the worker ran goes in one batch
+    assert apply.batches == [[0, 1, 2, 3, 4]]
+    assert [queue.get(job.id).result for job in jobs] == [0, 2, 4, 6, 8]
+    assert all(job.status == "done" and job.finished_at for job in jobs)
+
+@pytest.mark.asyncio
+async def test_batches_are_bounded():
+    apply = RecordingApply()
+    queue = IngestQueue(apply, workers=1, batch_size=2)
+
+    for item in range(5):
+        queue.submit(item)
+    await queue.close()
+
+    assert [len(batch) for batch in apply.batches] == [2, 2, 1]
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects():
+    queue = IngestQueue(RecordingApply(), max_size=2)
+
+    queue.submit(1)
+    queue.submit(2)
+    with pytest.raises(QueueFull):
+        queue.submit(3)
+
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_failed_batch_marks_its_jobs():
+    queue = IngestQueue(RecordingApply(fail=True), workers=1)
+
+    job = queue.submit(1)
+    await queue.close()
+
+    assert job.status == "failed"
+    assert job.error == "database unavailable"
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_job_by_job():
+    async def apply(items):
+        if -1 in items:
+            raise ValueError("bad item")
+        return [item * 2 for item in items]
+
+    queue = IngestQueue(apply, workers=1, batch_size=10)
+    jobs = [queue.submit(item) for item in (1, -1, 2)]
+    await queue.close()
+
+    assert [job.status for job in jobs] == ["done", "failed", "done"]
+    assert [job.result for job in jobs] == [2, None, 4]
+    assert jobs[1].error == "bad item"
+
+@pytest.mark.asyncio
+async def test_finished_jobs_are_bounded():
+    queue = IngestQueue(RecordingApply(), max_jobs=2)
+
+    first = queue.submit(1)
+    queue.submit(2)
+    last = queue.submit(3)
+    await queue.close()
+
+    assert queue.get(first.id) is None
+    assert queue.get(last.id).result == 6
+    assert queue.get("unknown") is None
+
+@pytest.mark.asyncio
+async def test_queue_frees_up_as_jobs_are_taken():
+    release = asyncio.Event()
+
+    async def slow_apply(items):
+        await release.wait()
+        return items
+
+    queue = IngestQueue(slow_apply, max_size=1, workers=1, batch_size=1)
+
+    queue.submit(1)
+    await asyncio.sleep(0)
+    # The worker holds the first job, so there is room for one more
+    queue.submit(2)
+    with pytest.raises(QueueFull):
+        queue.submit(3)
+
+    release.set()
+    await queue.close()
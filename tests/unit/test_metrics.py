@@ -0,0 +1,49 @@
+from backend.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_counter_and_gauge():
+    registry = Registry()
+    ingested = registry.register(Counter("games_ingested_total", "Games ingested.", ["outcome"]))
+    in_flight = registry.register(Gauge("in_flight", "In flight."))
+
+    ingested.inc(outcome="created")
+    ingested.inc(3, outcome="created")
+    ingested.inc(outcome="exists")
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    assert ingested.value(outcome="created") == 4
+    assert registry.render().splitlines() == [
+        "# HELP games_ingested_total Games ingested.",
+        "# TYPE games_ingested_total counter",
+        'games_ingested_total{outcome="created"} 4',
+        'games_ingested_total{outcome="exists"} 1',
+        "# HELP in_flight In flight.",
+        "# TYPE in_flight gauge",
+        "in_flight 1",
+    ]
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 1))
+
+    histogram.observe(0.05, route="/games")
+    histogram.observe(0.1, route="/games")
+    histogram.observe(0.5, route="/games")
+    histogram.observe(3, route="/games")
+
+    assert histogram.count(route="/games") == 4
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{route="/games",le="0.1"} 2',
+        'latency_seconds_bucket{route="/games",le="1"} 3',
+        'latency_seconds_bucket{route="/games",le="+Inf"} 4',
+        'latency_seconds_sum{route="/games"} 3.65',
+        'latency_seconds_count{route="/games"} 4',
+    ]
+
+def test_label_values_are_escaped():
+    counter = Counter("errors_total", "Errors.", ["message"])
+
+    counter.inc(message='bad "value"\n')
+
+    assert counter.render()[2] == 'errors_total{message="bad \\"value\\"\\n"} 1'
@@ -1,6 +1,7 @@
+import numpy as np
 import pytest
 from prisma.models import Game
-from backend.main import calculate_stats
+from backend.main import calculate_stats, game_stats_deltas, add_stats, empty_stats, compute_league_stats
 
 
 @pytest.fixture
@@ -80,3 +81,51 @@ def test_calculate_stats_single_game(sample_games_data):
     assert stats["points"] == 3
     assert stats["gamesPlayed"] == 1
 
+def test_game_stats_deltas_match_full_recalculation(sample_games_data):
+    stats = {1: empty_stats(), 2: empty_stats()}
+    for game in sample_games_data:
+        for team_id, delta in game_stats_deltas(game).items():
+            add_stats(stats[team_id], delta)
+
+    assert stats[1] == calculate_stats(sample_games_data, 1)
+    assert stats[2] == calculate_stats(sample_games_data, 2)
+
+def test_game_stats_deltas_reversal(sample_games_data):
+    stats = calculate_stats(sample_games_data, 1)
+
+    add_stats(stats, game_stats_deltas(sample_games_data[2], sign=-1)[1])
+
+    assert stats == calculate_stats(sample_games_data[:2], 1)
+
+def test_game_stats_deltas_unfinished_game(sample_games_data):
+    game = sample_games_data[0].model_copy(update={"status": "SCHEDULED", "homeScore": None, "awayScore": None})
+
+    assert game_stats_deltas(game) == {}
+
+def test_compute_league_stats_matches_calculate_stats(sample_games_data):
+    team_ids = np.array([1, 2, 3])
+    columns = [
+        np.array([getattr(game, column) for game in sample_games_data])
+        for column in ("homeTeamId", "awayTeamId", "homeScore", "awayScore")
+    ]
+
+    stats = compute_league_stats(team_ids, *columns)
+
+    for index, team_id in enumerate(team_ids):
+        expected = calculate_stats([game for game in sample_games_data if team_id in (game.homeTeamId, game.awayTeamId)], team_id)
+        assert {field: int(values[index]) for field, values in stats.items()} == expected
+
+def test_compute_league_stats_no_games():
+    empty = np.array([], dtype=np.int64)
+
+    stats = compute_league_stats(np.array([4, 9]), empty, empty, empty, empty)
+
+    assert all(values.tolist() == [0, 0] for values in stats.values())
+
+def test_compute_league_stats_rejects_unknown_teams():
+    scores = np.array([1])
+
+    # 5 would otherwise be credited to team 4's slot, 12 to one past the end
+    for missing in (5, 12):
+        with pytest.raises(ValueError):
+            compute_league_stats(np.array([4, 9]), np.array([missing]), np.array([9]), scores, scores)
@@ -0,0 +1,88 @@
+import os
+import sys
+import pytest
+
+# The scraper runs as a script from its own directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "scraper"))
+
+from engines import ENGINE_PREFERENCE, available_engines, default_engine, parse_html
+from parser import LeagueParser
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "fixtures", "scraper")
+
+PAGES = [
+    ("results.html", LeagueParser.parse_results_page),
+    ("schedule.html", LeagueParser.parse_schedule_page),
+    ("league_table.html", LeagueParser.parse_league_table_page),
+]
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+@pytest.mark.parametrize("engine", available_engines())
+@pytest.mark.parametrize("page, parse", PAGES)
+def test_engines_produce_identical_records(engine, page, parse):
+    html = load_fixture(page)
+
+    assert parse(html, engine=engine) == parse(html, engine="html.parser")
+
+def test_results_page():
+    results = LeagueParser.parse_results_page(load_fixture("results.html"))
+
+    # Unscored and future games are skipped
+    assert len(results) == 5
+    assert results[1]["home_team"] == "Hawks & Doves"
+    assert (results[0]["home_score"], results[0]["away_score"]) == (3, 1)
+    assert (results[0]["field_name"], results[0]["field_num"]) == ("Riverside Park", 1)
+    assert (results[0]["away_team_primary_color"], results[0]["away_team_secondary_color"]) == ("#0000FF", "#FFFF00")
+    assert (results[3]["home_team"], results[3]["info"]) == ("Red Lions", "Semi Final")
+
+def test_schedule_page():
+    fixtures = LeagueParser.parse_schedule_page(load_fixture("schedule.html"))
+
+    # The TBD fixture is skipped
+    assert len(fixtures) == 5
+    assert [fixture["home_team"] for fixture in fixtures] == ["Red Lions", "Hawks & Doves", "Blue Sharks", "Green Machine", "Red Lions"]
+    assert fixtures[3]["field_num"] == "Unknown"
+    assert fixtures[4]["info"] == "Final"
+    assert fixtures[0]["game_time"][:10] == "2025-09-22"
+
+def test_league_table_page():
+    teams = LeagueParser.parse_league_table_page(load_fixture("league_table.html"))
+
+    assert [(team["name"], team["div"]) for team in teams] == [
+        ("Red Lions", 1), ("Hawks & Doves", 1), ("Green Machine", 1), ("Blue Sharks", 2), ("New Team", 2)
+    ]
+    assert teams[0]["points"] == 7
+    assert teams[4]["points"] == -1
+
+def test_default_engine(monkeypatch):
+    monkeypatch.delenv("SCRAPER_PARSER", raising=False)
+    assert default_engine() == available_engines()[0]
+    assert set(available_engines()) <= set(ENGINE_PREFERENCE)
+
+    monkeypatch.setenv("SCRAPER_PARSER", "html.parser")
+    assert default_engine() == "html.parser"
+
+    monkeypatch.setenv("SCRAPER_PARSER", "nope")
+    with pytest.raises(ValueError):
+        default_engine()
+
+@pytest.mark.parametrize("engine", ["html.parser", "lxml"])
+def test_soup_engines_only_build_requested_subtrees(engine):
+    if engine not in available_engines():
+        pytest.skip(f"{engine} is not installed")
+
+    root = parse_html(load_fixture("schedule.html"), engine, only=("table", "generalDataTable"))
+
+    assert root.css("nav") == []
+    assert root.css("script") == []
+    assert len(root.css("table.generalDataTable")) == 3
+
+def test_schedule_dates_come_from_each_table():
+    fixtures = LeagueParser.parse_schedule_page(load_fixture("schedule.html"))
+
+    assert [fixture["game_time"][:10] for fixture in fixtures] == ["2025-09-22", "2025-09-22", "2025-09-29", "2025-09-29", "2025-10-06"]
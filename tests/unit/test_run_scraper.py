@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+import requests
+
+# The scraper runs as a script from its own directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "scraper"))
+
+import run_scraper
+from run_scraper import send_in_batches
+
+
+class FakeApi:
+    """
+    Answers 422 for any batch holding a game without a field number, and
+    `status` for everything else.
+    """
+
+    def __init__(self, status=200):
+        self.status = status
+        self.batches = []
+
+    def __call__(self, method, url, data):
+        batch = json.loads(data)
+        self.batches.append(batch)
+        response = requests.Response()
+        response._content = b"{}"
+        response.status_code = 422 if any(game["field_num"] == "Unknown" for game in batch) else self.status
+        return response
+
+
+def test_rejected_records_dont_block_the_run(monkeypatch):
+    api = FakeApi()
+    monkeypatch.setattr(run_scraper.requests, "request", api)
+    games = [{"field_num": 1}, {"field_num": "Unknown"}, {"field_num": 2}]
+
+    assert send_in_batches("PUT", "/games/bulk", games)
+    # The batch, then each game on its own
+    assert api.batches == [games, *[[game] for game in games]]
+
+def test_server_errors_are_retried_next_run(monkeypatch):
+    monkeypatch.setattr(run_scraper.requests, "request", FakeApi(status=503))
+    assert not send_in_batches("PUT", "/games/bulk", [{"field_num": 1}])
+
+def test_connection_errors_are_retried_next_run(monkeypatch):
+    def unreachable(method, url, data):
+        raise requests.ConnectionError("connection refused")
+
+    monkeypatch.setattr(run_scraper.requests, "request", unreachable)
+    assert not send_in_batches("PUT", "/games/bulk", [{"field_num": 1}])
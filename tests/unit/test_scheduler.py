@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from backend.scheduler import RefreshScheduler
+
+
+class RecordingRefresh:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, team_ids, divs):
+        self.calls.append((team_ids, divs))
+
+
+@pytest.mark.asyncio
+async def test_marks_are_coalesced():
+    refresh = RecordingRefresh()
+    scheduler = RefreshScheduler(refresh, delay=0.05)
+
+    scheduler.mark(team_ids=[1, 2])
+    scheduler.mark(team_ids=[2, 3], divs=[1])
+    scheduler.mark(divs=[1, 2])
+    assert refresh.calls == []
+
+    await asyncio.sleep(0.1)
+
+    assert refresh.calls == [({1, 2, 3}, {1, 2})]
+    assert not scheduler.pending
+
+@pytest.mark.asyncio
+async def test_flush_runs_immediately():
+    refresh = RecordingRefresh()
+    scheduler = RefreshScheduler(refresh, delay=10)
+
+    scheduler.mark(team_ids=[1])
+    await scheduler.flush()
+    assert refresh.calls == [({1}, set())]
+
+    # Nothing left to do
+    await scheduler.close()
+    assert len(refresh.calls) == 1
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_marks():
+    attempts = []
+
+    async def failing_refresh(team_ids, divs):
+        attempts.append((team_ids, divs))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+
+    scheduler = RefreshScheduler(failing_refresh, delay=10)
+    scheduler.mark(divs=[4])
+
+    await scheduler.flush()
+    assert scheduler.pending
+
+    await scheduler.close()
+    assert attempts == [(set(), {4}), (set(), {4})]
+    assert not scheduler.pending
+
+@pytest.mark.asyncio
+async def test_mark_during_refresh_is_not_lost():
+    calls = []
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_refresh(team_ids, divs):
+        calls.append((team_ids, divs))
+        started.set()
+        await release.wait()
+
+    scheduler = RefreshScheduler(slow_refresh, delay=0.01)
+    scheduler.mark(team_ids=[1])
+    await started.wait()
+
+    # The running refresh already took its marks
+    scheduler.mark(team_ids=[2])
+    release.set()
+    await asyncio.sleep(0.1)
+
+    assert calls == [({1}, set()), ({2}, set())]
+    assert not scheduler.pending
+
+@pytest.mark.asyncio
+async def test_failed_refresh_is_retried():
+    attempts = []
+
+    async def flaky_refresh(team_ids, divs):
+        attempts.append((team_ids, divs))
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+
+    scheduler = RefreshScheduler(flaky_refresh, delay=0.01)
+    scheduler.mark(divs=[4])
+    await asyncio.sleep(0.1)
+
+    assert attempts == [(set(), {4}), (set(), {4})]
+    assert not scheduler.pending